@@ -16,11 +16,14 @@
 
 import os
 import csv
+import weakref
 
 from gi.repository import Gtk, GObject, Gedit, PeasGtk, Gio
-from addiks_hints.gladehandler import GladeHandler
-from hintmanager import HintManager
+from rulesetindex import RulesetIndex
 
+# Everything beyond the bare plugin objects (settings, checkers, glade) is built
+# when it is first needed, which is when the first PHP document gets checked;
+# gedit sessions without PHP never load the checker modules.
 class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable):
     app = GObject.property(type=Gedit.App)
 
@@ -29,30 +32,24 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         self._glade_builder = None
         self._glade_handler = None
         self._hint_manager = None
+        self._hint_scheduler = None
+        self._ruleset_indices = {}
         self._settings = None
-
-        if not os.path.exists(os.path.dirname(__file__)+"/gschemas.compiled"):
-            pass
-
-        schema_source = Gio.SettingsSchemaSource.new_from_directory(
-            os.path.dirname(__file__),
-            Gio.SettingsSchemaSource.get_default(),
-            False,
-        )
-        schema = schema_source.lookup('de.addiks.gedit.hints', False)
-        self._settings = Gio.Settings.new_full(schema, None, None)
-
-        for name in ['phplint', 'phpmd', 'phpcs']:
-            isActive = self._settings.get_boolean(name)
-            self.get_hint_manager().set_adapter_state(name, isActive)
+        self._repair_rules = None
 
     def set_config(self, name, is_active):
-        self.get_hint_manager().set_adapter_state(name, is_active)
+        # a hint manager built later reads the (bound) setting itself
+        if self._hint_manager != None:
+            self._hint_manager.set_adapter_state(name, is_active)
 
     def do_activate(self):
         AddiksHintsApp.__instance = self
 
     def do_deactivate(self):
+        if self._hint_scheduler != None:
+            self._hint_scheduler.shutdown()
+        if self._hint_manager != None:
+            self._hint_manager.shutdown()
         AddiksHintsApp.__instance = None
 
     def do_update_state(self):
@@ -71,10 +68,18 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
             ["phpmd",        "switchPHPMD"],
             ["phpcs",        "switchPHPCS"]]:
             switch = glade_builder.get_object(objectName)
-            self._settings.bind(key, switch, "active", Gio.SettingsBindFlags.DEFAULT)
+            self.get_settings().bind(key, switch, "active", Gio.SettingsBindFlags.DEFAULT)
         return glade_builder.get_object("gridConfig")
 
     def get_settings(self):
+        if self._settings == None:
+            schema_source = Gio.SettingsSchemaSource.new_from_directory(
+                os.path.dirname(__file__),
+                Gio.SettingsSchemaSource.get_default(),
+                False,
+            )
+            schema = schema_source.lookup('de.addiks.gedit.hints', False)
+            self._settings = Gio.Settings.new_full(schema, None, None)
         return self._settings
 
     ### PHPMD
@@ -90,15 +95,13 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         with open(path, "a") as handle:
             writer = csv.writer(handle, delimiter=",")
             writer.writerow([directory, ruleset])
+        self._get_ruleset_index("phpmd").invalidate()
 
     def get_all_phpmd_rulesets(self):
-        path = self.get_phpmd_ruleset_file()
-        rulesets = []
-        with open(path, "r") as handle:
-            reader = csv.reader(handle, delimiter=",")
-            for directory, ruleset in reader:
-                rulesets.append([directory, ruleset])
-        return rulesets
+        return self._get_ruleset_index("phpmd").get_all()
+
+    def get_phpmd_rulesets_for_file(self, filePath):
+        return self._get_ruleset_index("phpmd").get_rulesets_for_file(filePath)
 
     def remove_phpmd_ruleset(self, needleRuleset, needleDirectory):
         path = self.get_phpmd_ruleset_file()
@@ -112,6 +115,7 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         path = self.get_phpmd_ruleset_file()
         with open(path, 'w'):
             os.utime(path)
+        self._get_ruleset_index("phpmd").invalidate()
 
     def update_phpmd_ruleset_treeview(self):
         builder = self._getGladeBuilder()
@@ -145,15 +149,13 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         with open(path, "a") as handle:
             writer = csv.writer(handle, delimiter=",")
             writer.writerow([directory, ruleset])
+        self._get_ruleset_index("phpcs").invalidate()
 
     def get_all_phpcs_rulesets(self):
-        path = self.get_phpcs_ruleset_file()
-        rulesets = []
-        with open(path, "r") as handle:
-            reader = csv.reader(handle, delimiter=",")
-            for directory, ruleset in reader:
-                rulesets.append([directory, ruleset])
-        return rulesets
+        return self._get_ruleset_index("phpcs").get_all()
+
+    def get_phpcs_rulesets_for_file(self, filePath):
+        return self._get_ruleset_index("phpcs").get_rulesets_for_file(filePath)
 
     def remove_phpcs_ruleset(self, needleRuleset, needleDirectory):
         path = self.get_phpcs_ruleset_file()
@@ -161,12 +163,13 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         self.reset_phpcs_ruleset_file()
         for directory, ruleset in rulesets:
             if ruleset != needleRuleset or directory != needleDirectory:
-                self.add_phpmd_ruleset(ruleset, directory)
+                self.add_phpcs_ruleset(ruleset, directory)
 
     def reset_phpcs_ruleset_file(self):
         path = self.get_phpcs_ruleset_file()
         with open(path, 'w'):
             os.utime(path)
+        self._get_ruleset_index("phpcs").invalidate()
 
     def update_phpcs_ruleset_treeview(self):
         builder = self._getGladeBuilder()
@@ -187,6 +190,23 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
                 os.utime(path)
         return path
 
+    def get_project_directory(self, filePath):
+        # the outermost directory that has a ruleset registered for this file
+        directories = self._get_ruleset_index("phpcs").get_directories_for_file(filePath)
+        directories += self._get_ruleset_index("phpmd").get_directories_for_file(filePath)
+        if len(directories) <= 0:
+            return None
+        return sorted(directories, key=lambda directory: len(directory.rstrip("/")))[0]
+
+    def _get_ruleset_index(self, toolName):
+        if toolName not in self._ruleset_indices:
+            if toolName == "phpmd":
+                path = self.get_phpmd_ruleset_file()
+            else:
+                path = self.get_phpcs_ruleset_file()
+            self._ruleset_indices[toolName] = RulesetIndex(path)
+        return self._ruleset_indices[toolName]
+
     ### SINGLETON
 
     __instance = None
@@ -199,46 +219,62 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
 
     ### WINDOW / VIEW MANAGEMENT
 
-    windows = []
+    # Class level, so an instance made by the get() fallback shares them. Keyed by the
+    # gedit objects; the plugin objects are held weakly and drop out once they are gone.
+    _windows        = weakref.WeakValueDictionary() # Gedit.Window => AddiksHintsWindow
+    _window_by_view = weakref.WeakValueDictionary() # Gedit.View   => AddiksHintsWindow
+    _views          = weakref.WeakValueDictionary() # Gedit.View   => AddiksHintsView
 
     def get_all_windows(self):
-        return self.windows
+        return list(self._windows.values())
 
     def register_window(self, window):
-        if window not in self.windows:
-            self.windows.append(window)
+        self._windows[window.window] = window
+        for view in window.window.get_views():
+            self._window_by_view[view] = window
 
     def unregister_window(self, window):
-        if window in self.windows:
-            self.windows.remove(window)
+        if self._windows.get(window.window) == window:
+            del self._windows[window.window]
+        for view in window.window.get_views():
+            self.unregister_tab_view(window, view)
 
-    def get_window_by_view(self, view):
-        for window in self.windows:
-            if view in window.window.get_views():
-                return window
+    def register_tab_view(self, window, view):
+        # called on tab-added; a tab moved to another window arrives here again
+        self._window_by_view[view] = window
 
-    views = []
+    def unregister_tab_view(self, window, view):
+        # called on tab-removed; the tab may already belong to another window
+        if self._window_by_view.get(view) == window:
+            del self._window_by_view[view]
+
+    def get_window_by_view(self, view):
+        window = self._window_by_view.get(view)
+        if window == None:
+            # the view of a tab whose tab-added signal did not come in yet
+            for candidate in list(self._windows.values()):
+                if view in candidate.window.get_views():
+                    self._window_by_view[view] = candidate
+                    return candidate
+        return window
 
     def get_all_views(self):
-        return self.views
+        return list(self._views.values())
 
     def register_view(self, view):
-        if view not in self.views:
-            self.views.append(view)
+        self._views[view.view] = view
 
     def unregister_view(self, view):
-        if view in self.views:
-            self.views.remove(view)
+        if self._views.get(view.view) == view:
+            del self._views[view.view]
 
     def get_plugin_view_by_view(self, view):
-        for pluginView in self.views:
-            if pluginView.view == view:
-                return pluginView
+        return self._views.get(view)
 
     ### PATHS
 
     def get_data_dir(self):
-        return expanduser("~/.local/share/gedit/addiks/hints")
+        return os.path.expanduser("~/.local/share/gedit/addiks/hints")
 
     ### GLADE
 
@@ -253,6 +289,7 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
         return self._glade_builder
 
     def __initGlade(self):
+        from addiks_hints.gladehandler import GladeHandler
         self._glade_builder = Gtk.Builder()
         self._glade_builder.add_from_file(os.path.dirname(__file__)+"/hints.glade")
         self._glade_handler = GladeHandler(self, self._glade_builder)
@@ -262,9 +299,68 @@ class AddiksHintsApp(GObject.Object, Gedit.AppActivatable, PeasGtk.Configurable)
 
     def get_hint_manager(self):
         if self._hint_manager == None:
-            self._hint_manager = HintManager(self, self.get_data_dir)
+            from hintmanager import HintManager
+            self._hint_manager = self.__configure_hint_manager(HintManager(self, self.get_data_dir()))
         return self._hint_manager
 
-    def get_hints_by_file(self, filePath, content=None):
+    def has_hint_scheduler(self):
+        return self._hint_scheduler != None
+
+    def get_hint_scheduler(self):
+        if self._hint_scheduler == None:
+            from hintscheduler import HintScheduler
+            self._hint_scheduler = HintScheduler(self.get_settings().get_int("max-jobs"))
+        return self._hint_scheduler
+
+    def get_repair_rules(self):
+        if self._repair_rules == None:
+            from repairrules import RepairRules
+            self._repair_rules = RepairRules()
+        return self._repair_rules
+
+    def get_hints_by_file(self, filePath, content=None, cancellable=None):
         hint_manager = self.get_hint_manager()
-        return hint_manager.get_hints_by_file(filePath, content)
+        return hint_manager.get_hints_by_file(filePath, content, cancellable)
+
+    def __configure_hint_manager(self, hint_manager):
+        settings = self.get_settings()
+
+        for name in ['phplint', 'phpmd', 'phpcs']:
+            isActive = settings.get_boolean(name)
+            hint_manager.set_adapter_state(name, isActive)
+
+        hint_manager.set_parallel_mode(
+            settings.get_boolean("parallel"),
+            settings.get_int("max-workers")
+        )
+
+        hint_manager.set_cache_limits(
+            settings.get_int("cache-max-entries"),
+            settings.get_int("cache-max-bytes"),
+            settings.get_boolean("cache-persistent")
+        )
+
+        hint_manager.set_project_index_mode(settings.get_boolean("project-index"))
+
+        hint_manager.set_stats_log_mode(settings.get_boolean("stats-log"))
+
+        for name in ['phplint', 'phpmd', 'phpcs']:
+            hint_manager.set_adapter_limits(
+                name,
+                settings.get_int(name + "-timeout"),
+                settings.get_int("tool-memory-limit"),
+                settings.get_int("tool-cpu-limit")
+            )
+
+        hint_manager.set_lint_worker_mode(
+            settings.get_boolean("phplint-worker"),
+            settings.get_boolean("phplint-incremental")
+        )
+
+        hint_manager.set_tool_server_mode(
+            settings.get_boolean("tool-servers"),
+            settings.get_int("tool-server-idle-timeout"),
+            settings.get_int("tool-server-memory-limit")
+        )
+
+        return hint_manager
@@ -15,10 +15,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from gi.repository import Gtk, GObject, Gedit, Pango
+from gi.repository import Gtk, GObject, Gedit, Pango, GLib
 import os
-from _thread import start_new_thread
+import cairo
 from AddiksHintsApp import AddiksHintsApp
+from hinttags import HintTagState
+from hintindex import HintIndex
+
+TAG_BATCH_SIZE = 250
+RULER_WIDTH = 3
 
 class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
     view = GObject.property(type=Gedit.View)
@@ -26,6 +31,16 @@ class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
     def __init__(self):
         self.__drawArea = None
         self.__tags = {}
+        self.__generation = 0
+        self.__cancellable = None
+        self.__debounceSourceId = None
+        self.__tagState = HintTagState()
+        self.__tagOperations = []
+        self.__tagBatchSourceId = None
+        self.__hintIndex = HintIndex()
+        self.__rulerSurface = None
+        self.__rulerKey = None
+        self.__handlers = [] # [object, handlerId]
         GObject.Object.__init__(self)
 
     def do_activate(self):
@@ -46,33 +61,111 @@ class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
 
             self.__drawArea = scrolledWindow
             self.__drawArea.set_property("app-paintable", True)
-            self.__drawArea.connect("size-allocate", self.on_drawingarea_size_allocate)
-            self.__drawArea.connect_after("draw", self.on_drawingarea_draw)
+            self.__handlers += [
+                [self.__drawArea, self.__drawArea.connect("size-allocate", self.on_drawingarea_size_allocate)],
+                [self.__drawArea, self.__drawArea.connect_after("draw", self.on_drawingarea_draw)],
+            ]
 
-        self.view.connect("query_tooltip", self._on_query_tooltip)
+        self.__handlers.append([self.view, self.view.connect("query_tooltip", self._on_query_tooltip)])
         self.view.set_has_tooltip(True)
 
         if document != None:
-            document.connect("loaded", self.update_hints_threaded)
-            document.connect("saved", self.update_hints_threaded)
+            self.__handlers += [
+                [document, document.connect("loaded", self.update_hints_threaded)],
+                [document, document.connect("saved", self.update_hints_threaded)],
+                [document, document.connect("insert-text", self.on_document_insert_text)],
+                [document, document.connect("delete-range", self.on_document_delete_range)],
+                [document, document.connect("changed", self.on_document_changed)],
+            ]
 
     def do_deactivate(self):
+        # a disabled plugin must not react to typing anymore, nor twice once enabled again
+        for gobject, handlerId in self.__handlers:
+            gobject.disconnect(handlerId)
+        self.__handlers = []
+        self.__cancel_pending()
+        self.__cancel_tag_batch()
+        if AddiksHintsApp.get().has_hint_scheduler():
+            AddiksHintsApp.get().get_hint_scheduler().forget(self)
         AddiksHintsApp.get().unregister_view(self)
 
+    def on_document_insert_text(self, document, location, text, length, data=None):
+        self.__cancel_tag_batch()
+        self.__tagState.record_insert(location.get_line(), text.count("\n"))
+
+    def on_document_delete_range(self, document, start, end, data=None):
+        self.__cancel_tag_batch()
+        self.__tagState.record_delete(start.get_line(), end.get_line() - start.get_line())
+
+    def on_document_changed(self, document, data=None):
+        if not self.__is_php(document):
+            return
+        settings = AddiksHintsApp.get().get_settings()
+        if not settings.get_boolean("live"):
+            return
+        self.__cancel_pending()
+        delay = settings.get_int("live-delay")
+        self.__debounceSourceId = GLib.timeout_add(delay, self.__on_debounce_timeout)
+
+    def __on_debounce_timeout(self):
+        self.__debounceSourceId = None
+        self.update_hints_threaded()
+        return False
+
+    def __begin_run(self):
+        from hintmanager import Cancellable
+        self.__cancel_pending()
+        self.__cancellable = Cancellable()
+        return (self.__generation, self.__cancellable, )
+
+    def __is_php(self, document):
+        # the checkers only look at .php files; anything else never loads them
+        location = document.get_location()
+        return location != None and location.get_path() != None and location.get_path()[-4:] == '.php'
+
+    def __cancel_pending(self):
+        # a newer revision of the document is coming, results for the current one are worthless
+        self.__generation += 1
+        if self.__debounceSourceId != None:
+            GLib.source_remove(self.__debounceSourceId)
+            self.__debounceSourceId = None
+        if self.__cancellable != None:
+            self.__cancellable.cancel()
+            self.__cancellable = None
+
     def on_drawingarea_size_allocate(self, widget, allocationRect, data=None):
         widget.queue_draw()
 
-    def on_drawingarea_draw(self, widget, cairo, data=None):
-        textView = self.view
-        lineCount = textView.get_buffer().get_end_iter().get_line()
+    def on_drawingarea_draw(self, widget, cairoContext, data=None):
+        lineCount = self.view.get_buffer().get_end_iter().get_line()
 
         viewHeight = widget.get_allocated_height()
         viewWidth  = widget.get_allocated_width()
 
-        width = 3
-        if hasattr(textView, 'addiks_hints'):
-            for lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority in textView.addiks_hints:
-                lineEnd += 1
+        width = RULER_WIDTH
+        rulerKey = (lineCount, viewWidth, viewHeight)
+        if self.__rulerSurface == None or self.__rulerKey != rulerKey:
+            self.__rulerSurface = self.__render_ruler(cairoContext, lineCount, width, viewHeight)
+            self.__rulerKey = rulerKey
+
+        cairoContext.set_source_surface(self.__rulerSurface, viewWidth-width, 0)
+        cairoContext.rectangle(viewWidth-width, 0, width, viewHeight)
+        cairoContext.fill()
+
+        return False
+
+    def __render_ruler(self, cairoContext, lineCount, width, viewHeight):
+        surface = cairoContext.get_target().create_similar(cairo.CONTENT_COLOR_ALPHA, width, max(viewHeight, 1))
+
+        if lineCount < 1:
+            lineCount = 1
+
+        # later hints (higher priority value) are drawn over earlier ones, so the last one per pixel-row wins
+        rows = [None] * viewHeight
+        if hasattr(self.view, 'addiks_hints'):
+            for hint in self.view.addiks_hints:
+                lineBegin = hint.line_begin
+                lineEnd   = hint.line_end + 1
 
                 top    = int((lineBegin / lineCount) * viewHeight)
                 bottom = int((lineEnd   / lineCount) * viewHeight)
@@ -81,12 +174,27 @@ class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
                 if height < 10:
                     height = 10
 
-                red, green, blue = self.hexToIntColors(color)
-                cairo.set_source_rgb(red/255, green/255, blue/255)
-                cairo.rectangle(viewWidth-width, top, width, height)
-                cairo.fill()
-
-        return False
+                top    = max(0, min(top, viewHeight))
+                bottom = max(0, min(top + height, viewHeight))
+                rows[top:bottom] = [hint.color] * (bottom - top)
+
+        surfaceContext = cairo.Context(surface)
+        colors = {}
+        runTop = 0
+        for row in range(1, viewHeight+1):
+            if row < viewHeight and rows[row] == rows[runTop]:
+                continue
+            color = rows[runTop]
+            if color != None:
+                if color not in colors:
+                    colors[color] = self.hexToIntColors(color)
+                red, green, blue = colors[color]
+                surfaceContext.set_source_rgb(red/255, green/255, blue/255)
+                surfaceContext.rectangle(0, runTop, width, row - runTop)
+                surfaceContext.fill()
+            runTop = row
+
+        return surface
 
     def hexToIntColors(self, hexCode):
         redHex   = hexCode[1:3]
@@ -105,77 +213,149 @@ class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
         else:
             mouse_x, mouse_y = textView.window_to_buffer_coords(Gtk.TextWindowType.WIDGET, x, y)
             textIter, trailing = textView.get_iter_at_position(mouse_x, mouse_y)
-        hasTag = False
-        for tagKey in self.__tags:
-            tag = self.__tags[tagKey]
-            if textIter.has_tag(tag):
-                hasTag = True
-                break
-        if hasTag:
-            tooltipMessages = []
-            textIterLine = textIter.get_line()
-            textIterColumn = textIter.get_line_offset()
-            for lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority in textView.addiks_hints:
-                if (textIterLine >= lineBegin and textIterLine <= lineEnd and
-                    textIterColumn >= columnBegin and textIterColumn <= columnEnd):
-                    tooltipMessages.append(message)
+        textIterLine = textIter.get_line()
+        textIterColumn = textIter.get_line_offset()
+        if self.__hintIndex.has_hints_at(textIterLine, textIterColumn):
+            tooltipMessages = self.__hintIndex.get_messages_at(textIterLine, textIterColumn)
             tooltip.set_markup("\n".join(tooltipMessages))
             return True
         else:
             return False
 
     def update_hints_threaded(self, document=None, foo=None):
-        start_new_thread(self.update_hints, (document, foo, ))
+        if document == None:
+            document = self.view.get_buffer()
+
+        if not self.__is_php(document):
+            self.__cancel_pending()
+            self.apply_hints([], document)
+            return
+
+        generation, cancellable = self.__begin_run()
+
+        filePath = document.get_location().get_path()
+        content  = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
+
+        AddiksHintsApp.get().get_hint_scheduler().schedule(
+            self,
+            lambda: AddiksHintsApp.get().get_hints_by_file(filePath, content, cancellable),
+            lambda hints: self.__on_hints_ready(hints, generation, document)
+        )
+
+    def __on_hints_ready(self, hints, generation, document):
+        if hints == None or generation != self.__generation:
+            return
+        self.__cancellable = None
+        self.apply_hints(hints, document)
 
     def update_hints(self, document=None, foo=None):
         if document == None:
             document = self.view.get_buffer()
 
-        for tagKey in self.__tags:
-            document.remove_tag(self.__tags[tagKey],  document.get_start_iter(), document.get_end_iter())
+        if not self.__is_php(document):
+            self.__cancel_pending()
+            self.apply_hints([], document)
+            return
+
+        generation, cancellable = self.__begin_run()
 
-        self.view.addiks_hints = []
+        filePath = document.get_location().get_path()
 
-        if document.get_location() != None:
-            filePath = document.get_location().get_path()
+        content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
 
-            content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
+        hints = AddiksHintsApp.get().get_hints_by_file(filePath, content, cancellable)
 
-            hintLines = []
-            for lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority in AddiksHintsApp.get().get_hints_by_file(filePath, content):
-                tag = self.get_hint_tag(color)
+        self.__on_hints_ready(hints, generation, document)
+
+    def apply_hints(self, hints, document=None):
+        if document == None:
+            document = self.view.get_buffer()
 
-                lineBegin = int(lineBegin)
-                lineEnd = int(lineEnd)
-                columnBegin = int(columnBegin)
-                columnEnd = int(columnEnd)
+        self.__cancel_tag_batch()
 
-                self.view.addiks_hints.append([lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority])
+        addiksHints = list(hints)
+        hintRanges  = []
+        for hint in addiksHints:
+            hintRanges.append((hint.line_begin, hint.line_end, hint.column_begin, hint.column_end, hint.color))
 
-                #continue
-                beginIter = document.get_end_iter().copy()
-                beginIter.set_line(lineBegin)
+        self.view.addiks_hints = addiksHints
+        self.__hintIndex = HintIndex(addiksHints)
+        self.__rulerSurface = None
 
-                if beginIter.get_chars_in_line() > columnBegin:
-                    beginIter.set_line_offset(columnBegin)
-                else:
-                    beginIter.forward_to_line_end()
+        clearAll, clearSpans, removeRanges, addRanges = self.__tagState.update(hintRanges)
 
-                endIter = beginIter.copy()
-                endIter.set_line(lineEnd)
+        if clearAll:
+            for tagKey in self.__tags:
+                document.remove_tag(self.__tags[tagKey],  document.get_start_iter(), document.get_end_iter())
 
-                if endIter.get_chars_in_line() > columnEnd:
-                    endIter.set_line_offset(columnEnd)
-                else:
-                    endIter.forward_to_line_end()
+        # removals have to happen before additions, a removed range may overlap an added one
+        operations = []
+        for lineBegin, lineEnd in clearSpans:
+            operations.append([False, lineBegin, lineEnd, 0, None, None])
+        for hintRange in removeRanges:
+            operations.append([False] + list(hintRange))
+        for hintRange in addRanges:
+            operations.append([True] + list(hintRange))
 
-                document.apply_tag(tag, beginIter, endIter)
-                for line in range(lineBegin, lineEnd):
-                    hintLines.append(line)
+        if len(operations) > 0:
+            self.__tagOperations = operations
+            self.__tagBatchSourceId = GLib.idle_add(self.__apply_tag_batch, document)
 
         if self.__drawArea != None:
             self.__drawArea.queue_draw()
 
+    def __apply_tag_batch(self, document):
+        operations = self.__tagOperations[:TAG_BATCH_SIZE]
+        self.__tagOperations = self.__tagOperations[TAG_BATCH_SIZE:]
+
+        for isAdd, lineBegin, lineEnd, columnBegin, columnEnd, color in operations:
+            if color == None:
+                beginIter = document.get_iter_at_line(lineBegin)
+                endIter = document.get_iter_at_line(lineEnd)
+                endIter.forward_to_line_end()
+                for tagKey in self.__tags:
+                    document.remove_tag(self.__tags[tagKey], beginIter, endIter)
+                continue
+
+            beginIter, endIter = self.__get_hint_iters(document, lineBegin, lineEnd, columnBegin, columnEnd)
+            if isAdd:
+                document.apply_tag(self.get_hint_tag(color), beginIter, endIter)
+            else:
+                document.remove_tag(self.get_hint_tag(color), beginIter, endIter)
+
+        if len(self.__tagOperations) > 0:
+            return True
+
+        self.__tagBatchSourceId = None
+        return False
+
+    def __cancel_tag_batch(self):
+        # whatever was not applied yet is unknown now, so the next update starts from scratch
+        if self.__tagBatchSourceId != None:
+            GLib.source_remove(self.__tagBatchSourceId)
+            self.__tagBatchSourceId = None
+            self.__tagOperations = []
+            self.__tagState.invalidate()
+
+    def __get_hint_iters(self, document, lineBegin, lineEnd, columnBegin, columnEnd):
+        beginIter = document.get_end_iter().copy()
+        beginIter.set_line(lineBegin)
+
+        if beginIter.get_chars_in_line() > columnBegin:
+            beginIter.set_line_offset(columnBegin)
+        else:
+            beginIter.forward_to_line_end()
+
+        endIter = beginIter.copy()
+        endIter.set_line(lineEnd)
+
+        if endIter.get_chars_in_line() > columnEnd:
+            endIter.set_line_offset(columnEnd)
+        else:
+            endIter.forward_to_line_end()
+
+        return (beginIter, endIter)
+
     def get_hint_tag(self, color):
 
         tagKey = "addiks_hint_" + color
@@ -192,6 +372,8 @@ class AddiksHintsView(GObject.Object, Gedit.ViewActivatable):
             #tag.set_property("underline-rgba", color)
             #print(tag.__gproperties__)
             #print(dir(tag))
-            self.__tags[tagKey] = tag
+
+        # the tag-table is shared with other views of the same document
+        self.__tags[tagKey] = tag
 
         return tag
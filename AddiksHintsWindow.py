@@ -15,9 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import re
+from threading import Thread
 
-from gi.repository import Gtk, GObject, Gedit
+from gi.repository import Gtk, GObject, GLib, Gedit
 
 from AddiksHintsApp import AddiksHintsApp
 
@@ -26,16 +26,25 @@ class AddiksHintsWindow(GObject.Object, Gedit.WindowActivatable):
 
     def __init__(self):
         GObject.Object.__init__(self)
+        self._scan_panel = None
+        self._handlers = []
 
     def do_activate(self):
         AddiksHintsApp.get().register_window(self)
+        self._handlers = [
+            self.window.connect("tab-added",   self.on_tab_added),
+            self.window.connect("tab-removed", self.on_tab_removed),
+        ]
 
         plugin_path = os.path.dirname(__file__)
 
         if "get_ui_manager" in dir(self.window):# build menu for gedit 3.10 (global menu per window)
             self._ui_manager = self.window.get_ui_manager()
             actions = [
-                ['RepairFileAction',  "Try to repair the file",  "<Ctrl><Alt>R",   self.on_repair_file],
+                ['RepairFileAction',  "Try to repair the file",   "<Ctrl><Alt>R",        self.on_repair_file],
+                ['FixFileAction',     "Fix the file with phpcbf", "<Ctrl><Alt><Shift>R", self.on_fix_file],
+                ['ScanProjectAction', "Scan the whole project",   "<Ctrl><Alt>P",        self.on_scan_project],
+                ['ShowStatsAction',   "Checker statistics",       None,                  self.on_show_stats],
             ]
 
             self._actions = Gtk.ActionGroup("AddiksHintsMenuActions")
@@ -50,225 +59,150 @@ class AddiksHintsWindow(GObject.Object, Gedit.WindowActivatable):
                 self._ui_manager.ensure_update()
 
     def do_deactivate(self):
+        if self._scan_panel != None:
+            self._scan_panel.remove()
+            self._scan_panel = None
+        for handlerId in self._handlers:
+            self.window.disconnect(handlerId)
+        self._handlers = []
         AddiksHintsApp.get().unregister_window(self)
 
     def do_update_state(self):
         pass
 
+    def on_tab_added(self, window, tab, data=None):
+        AddiksHintsApp.get().register_tab_view(self, tab.get_view())
+
+    def on_tab_removed(self, window, tab, data=None):
+        AddiksHintsApp.get().unregister_tab_view(self, tab.get_view())
+
     def get_accel_group(self):
         return self._ui_manager.get_accel_group()
 
-    def on_repair_file(self, action, data=None, cycleLimit=5):
-
+    def on_scan_project(self, action, data=None):
         view = self.window.get_active_view()
+        if view == None or view.get_buffer().get_location() == None:
+            return
+
+        filePath  = view.get_buffer().get_location().get_path()
+        directory = AddiksHintsApp.get().get_project_directory(filePath)
+        if directory == None:
+            print("No ruleset is registered for a directory containing " + filePath)
+            return
+
+        if self._scan_panel == None:
+            from addiks_hints.scanpanel import ScanPanel
+            self._scan_panel = ScanPanel(self.window)
+        self._scan_panel.start(AddiksHintsApp.get().get_hint_manager(), directory)
+
+    def on_show_stats(self, action, data=None):
+        lines = []
+        for entry in AddiksHintsApp.get().get_hint_manager().get_stats().get_summary():
+            line = "%s %s: %d runs, %d cached, %d timed out" % (
+                entry['adapter'], entry['ruleset'] or "", entry['runs'], entry['cache_hits'], entry['timeouts'])
+            for title, key in [["p50", 'wall_p50'], ["p95", 'wall_p95'], ["spawn", 'spawn_p50'], ["cpu", 'cpu_mean']]:
+                if entry[key] != None:
+                    line += ", %s %.3fs" % (title, entry[key])
+            lines.append(line)
+        if len(lines) <= 0:
+            lines.append("No checker has run yet.")
+
+        dialog = Gtk.MessageDialog(self.window, 0, Gtk.MessageType.INFO, Gtk.ButtonsType.CLOSE, "Checker statistics")
+        dialog.format_secondary_text("\n".join(lines))
+        dialog.run()
+        dialog.destroy()
+
+    def on_repair_file(self, action, data=None):
+        view = self.window.get_active_view()
+        if view == None or not hasattr(view, 'addiks_hints'):
+            return
 
         document = view.get_buffer()
+        content = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
 
-        patternStrings = [
-            'Expected (\d+) space after ([A-Z_]+) keyword; (\d+) found',
-            'Expected (\d+) space after closing parenthesis; found (\d+)',
-            'Expected (\d+) space after (opening|closing) brace; (\d+) found',
-            'Expected (\d+) spaces before opening brace; (\d+) found',
-            'Expected (\d+) newline at end of file; (\d+) found',
-            'Expected (\d+) newline after (opening|closing) brace; (\d+) found',
-            '[A-Za-z ]+ indented incorrectly; expected( at least)? (\d+) spaces, found (\d+)',
-            'Incorrect spacing between default value and equals sign for argument "$([a-zA-Z_]+)"; expected (\d+) but found (\d+)',
-            'Incorrect spacing between argument "$([a-zA-Z_]+)" and equals sign; expected (\d+) but found (\d+)',
-            'There must be one blank line after the last ([A-Z_]+) statement; (\d+) found;'
-        ]
+        app = AddiksHintsApp.get()
+        lines = content.split("\n")
 
-        patterns = {}
-        for patternString in patternStrings:
-            patterns[patternString] = re.compile(patternString)
-
-        results = {}
-
-        contentChanged = False
-
-        for lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority in reversed(view.addiks_hints):
-
-            if lineBegin > document.get_line_count():
-                lineBegin = document.get_line_count()
-            elif lineBegin < 0:
-                lineBegin = 0
-
-            if lineEnd > document.get_line_count():
-                lineEnd = document.get_line_count()
-            elif lineEnd < 0:
-                lineEnd = 0
-
-            textIter = document.get_iter_at_line_offset(lineBegin, 0)
-            textIter.forward_to_line_end()
-
-            if columnBegin > textIter.get_line_offset():
-                columnBegin = textIter.get_line_offset()-1
-            if columnBegin < 0:
-                columnBegin = 0
-
-            textIter = document.get_iter_at_line_offset(lineEnd, 0)
-            textIter.forward_to_line_end()
-
-            if columnEnd > textIter.get_line_offset():
-                columnEnd = textIter.get_line_offset()-1
-            if columnEnd < 0:
-                columnEnd = 0
-
-            textIterLineBegin = document.get_iter_at_line_offset(lineBegin, 0)
-            textIterBegin     = document.get_iter_at_line_offset(lineBegin, columnBegin)
-            textIterEnd       = document.get_iter_at_line_offset(lineEnd, columnEnd)
-
-            textIterLineBegin.forward_word_end()
-            textIterLineBegin.backward_word_start()
-            indentionChars = "".ljust(textIterLineBegin.get_line_offset(), " ")
-
-            for patternKey in patterns:
-                pattern = patterns[patternKey]
-                results[patternKey] = pattern.match(message)
-
-            if message == 'Opening brace of a class must be on the line after the definition':
-                textIterBegin, textIterEnd = textIterBegin.forward_search("{", Gtk.TextSearchFlags.VISIBLE_ONLY)
-                document.insert(textIterBegin, "\n", 1)
-                contentChanged = True
-
-            elif message == 'Opening brace should be on a new line':
-                textIterBegin, textIterEnd = textIterBegin.forward_search("{", Gtk.TextSearchFlags.VISIBLE_ONLY)
-                contentChanged = True
-                document.insert(textIterBegin, "\n"+indentionChars, 1+len(indentionChars))
-
-            elif results['Expected (\d+) space after ([A-Z_]+) keyword; (\d+) found'] != None:
-                expected, token, actual = results['Expected (\d+) space after ([A-Z_]+) keyword; (\d+) found'].group(1, 2, 3)
-                expected, actual = [int(expected), int(actual)]
-                textIterBegin, textIterEnd = textIterBegin.forward_search(token, Gtk.TextSearchFlags.CASE_INSENSITIVE)
-                contentChanged = True
-                if expected > actual:
-                    document.insert(textIterEnd, ''.ljust(expected - actual), expected - actual)
-                else:
-                    textIterNext = textIterEnd.copy()
-                    textIterNext.forward_chars(actual - expected)
-                    document.delete(textIterEnd, textIterNext)
-
-            elif results['[A-Za-z ]+ indented incorrectly; expected( at least)? (\d+) spaces, found (\d+)'] != None:
-                expected, actual = results['[A-Za-z ]+ indented incorrectly; expected( at least)? (\d+) spaces, found (\d+)'].group(2, 3)
-                expected, actual = [int(expected), int(actual)]
-                textIterBegin.set_line_offset(0)
-                contentChanged = True
-                if expected > actual:
-                    document.insert(textIterBegin, ''.ljust(expected - actual), expected - actual)
-                else:
-                    textIterNext = textIterBegin.copy()
-                    textIterNext.forward_chars(actual - expected)
-                    document.delete(textIterBegin, textIterNext)
-
-            elif results['Expected (\d+) space after (opening|closing) brace; (\d+) found'] != None:
-                expected, actual, braceType = results['Expected (\d+) space after (opening|closing) brace; (\d+) found'].group(1, 3, 2)
-                expected, actual = [int(expected), int(actual)]
-
-                if braceType == 'closing':
-                    textIterBegin, textIterEnd = textIterBegin.backward_search("}", Gtk.TextSearchFlags.VISIBLE_ONLY)
-                    if expected > actual:
-                        contentChanged = True
-                        document.insert(textIterEnd, ''.ljust(expected - actual), expected - actual)
-                    else:
-                        textIterNext = textIterEnd.copy()
-                        textIterNext.forward_chars(actual - expected)
-                        contentChanged = True
-                        document.delete(textIterEnd, textIterNext)
-
-                else:
-                    pass # TODO: implement
-
-            elif results['Expected (\d+) newline at end of file; (\d+) found'] != None:
-                expected, actual = results['Expected (\d+) newline at end of file; (\d+) found'].group(1, 2)
-                expected = int(expected)
-                actual   = int(actual)
-
-            elif results['Expected (\d+) newline after (opening|closing) brace; (\d+) found'] != None:
-                expected, actual, braceType = results['Expected (\d+) newline after (opening|closing) brace; (\d+) found'].group(1, 3, 2)
-                expected, actual = [int(expected), int(actual)]
-
-                if braceType == "opening":
-                    textIterEnd
-                    if expected > actual:
-                        contentChanged = True
-                        document.insert(textIterEnd, ''.ljust(expected - actual, "\n"), len(expected - actual))
-
-                    elif expected < actual:
-                        textIterNext = textIterEnd.copy()
-                        textIterNext.forward_chars(actual - expected)
-                        contentChanged = True
-                        document.delete(textIterEnd, textIterNext)
-                else:
-                    pass # TODO: implement
-
-            elif results['Expected (\d+) space after closing parenthesis; found (\d+)'] != None:
-                expected, actual = results['Expected (\d+) space after closing parenthesis; found (\d+)'].group(1, 2)
-                expected, actual = [int(expected), int(actual)]
-
-                if expected > actual:
-                    contentChanged = True
-                    document.insert(textIterEnd, ''.ljust(expected - actual), expected - actual)
-                else:
-                    textIterNext = textIterEnd.copy()
-                    textIterNext.forward_chars(actual - expected)
-                    contentChanged = True
-                    document.delete(textIterEnd, textIterNext)
-
-            elif results['Incorrect spacing between default value and equals sign for argument "$([a-zA-Z_]+)"; expected (\d+) but found (\d+)'] != None:
-                variable, expected, actual = results['Incorrect spacing between default value and equals sign for argument "($[a-zA-Z_]+)"; expected (\d+) but found (\d+)'].group(1, 2)
-                expected, actual = [int(expected), int(actual)]
-
-            elif results['Incorrect spacing between argument "$([a-zA-Z_]+)" and equals sign; expected (\d+) but found (\d+)'] != None:
-                variable, expected, actual = results['Incorrect spacing between argument "($[a-zA-Z_]+)" and equals sign; expected (\d+) but found (\d+)'].group(1, 2)
-                expected, actual = [int(expected), int(actual)]
-
-            elif results['Expected (\d+) spaces before opening brace; (\d+) found'] != None:
-                expected, actual = results['Expected (\d+) spaces before opening brace; (\d+) found'].group(1, 2)
-                expected, actual = [int(expected), int(actual)]
-
-            elif results['There must be one blank line after the last ([A-Z_]+) statement; (\d+) found;'] != None:
-                keyword, actual = results['There must be one blank line after the last ([A-Z_]+) statement; (\d+) found;'].group(1, 2)
-                actual   = int(actual)
-
-            elif message == 'The closing brace for the class must go on the next line after the body':
-                pass # remove all empty lines just before line-begin
-
-            elif message == 'Usage of ELSE IF is discouraged; use ELSEIF instead':
-                contentChanged = True
-                textIterNext = textIterBegin.copy()
-                textIterNext.forward_chars(len("else if"))
-                document.delete(textIterBegin, textIterNext)
-                document.insert(textIterBegin, "elseif", len("elseif"))
-
-            elif message == 'The static declaration must come after the visibility declaration':
-                contentChanged = True
-                textIterNext = textIterBegin.copy()
-                textIterNext.forward_chars(len("static "))
-                document.delete(textIterBegin, textIterNext)
-                textIterDeclBegin, textIterDeclEnd = textIterBegin.forward_search(" ", Gtk.TextSearchFlags.CASE_INSENSITIVE)
-                document.insert(textIterDeclEnd, "static ", len("static "))
-
-            elif message == 'Whitespace found at end of line':
-
-                textIter = document.get_iter_at_line_offset(lineBegin, 0)
-                textIter.forward_to_line_end()
-
-                textIterPrev = textIter.copy()
-                textIterPrev.backward_char()
-
-                while document.get_text(textIterPrev, textIter, False) == " ":
-                    contentChanged = True
-                    document.delete(textIterPrev, textIter)
-
-                    textIter = document.get_iter_at_line_offset(lineBegin, 0)
-                    textIter.forward_to_line_end()
-
-                    textIterPrev = textIter.copy()
-                    textIterPrev.backward_char()
+        # a content that was checked before (e.g. after an undo) brings its real findings along
+        getCachedHints = None
+        if document.get_location() != None:
+            filePath = document.get_location().get_path()
+            hintManager = app.get_hint_manager()
+            getCachedHints = lambda newLines: hintManager.get_cached_hints(filePath, "\n".join(newLines))
 
-            else:
-                print([lineBegin, lineEnd, columnBegin, columnEnd, message])
+        newLines, cycles = app.get_repair_rules().repair_until_fixed(
+            lines,
+            view.addiks_hints,
+            getCachedHints,
+            app.get_settings().get_int("repair-cycles")
+        )
+        if cycles <= 0 or newLines == lines:
+            return
+
+        self.__patch_lines(document, lines, newLines)
 
-        AddiksHintsApp.get().get_plugin_view_by_view(view).update_hints()
+        app.get_plugin_view_by_view(view).update_hints_threaded()
 
-        #if contentChanged and cycleLimit > 0:
-        #    self.on_repair_file(action, data, cycleLimit-1)
+    def on_fix_file(self, action, data=None):
+        view = self.window.get_active_view()
+        if view == None or view.get_buffer().get_location() == None:
+            return
+
+        document = view.get_buffer()
+        content  = document.get_text(document.get_start_iter(), document.get_end_iter(), False)
+        filePath = document.get_location().get_path()
+
+        hintManager = AddiksHintsApp.get().get_hint_manager()
+        thread = Thread(
+            target=lambda: GLib.idle_add(self.__apply_fixed_content, view, content, hintManager.get_fixed_content(filePath, content)),
+            name="addiks-hints-phpcbf",
+            daemon=True
+        )
+        thread.start()
+
+    def __apply_fixed_content(self, view, content, fixedContent):
+        if fixedContent == None:
+            return False
+
+        document = view.get_buffer()
+        if document.get_text(document.get_start_iter(), document.get_end_iter(), False) != content:
+            print("The document changed while phpcbf was running, its fixes were not applied")
+            return False
+
+        self.__patch_lines(document, content.split("\n"), fixedContent.split("\n"))
+        AddiksHintsApp.get().get_plugin_view_by_view(view).update_hints_threaded()
+        return False
+
+    def __patch_lines(self, document, lines, newLines):
+        # Only the changed hunks get replaced, bottom up and as one undo-step; marks
+        # like the cursor stay where they are unless their own line changed.
+        from difflib import SequenceMatcher
+        hunks = []
+        for tag, lineBegin, lineEnd, newBegin, newEnd in SequenceMatcher(None, lines, newLines).get_opcodes():
+            if tag != 'equal':
+                hunks.append([lineBegin, lineEnd, newLines[newBegin:newEnd]])
+
+        document.begin_user_action()
+        for lineBegin, lineEnd, hunkLines in reversed(hunks):
+            text = "\n".join(hunkLines)
+            if lineEnd < len(lines):
+                # up to the start of the first unchanged line
+                textIterBegin = document.get_iter_at_line(lineBegin)
+                textIterEnd   = document.get_iter_at_line(lineEnd)
+                if len(hunkLines) > 0:
+                    text += "\n"
+            elif lineBegin >= len(lines):
+                # lines appended at the end
+                textIterBegin = document.get_end_iter()
+                textIterEnd   = document.get_end_iter()
+                text = "\n" + text
+            else:
+                textIterBegin = document.get_iter_at_line(lineBegin)
+                textIterEnd   = document.get_end_iter()
+                if len(hunkLines) <= 0 and lineBegin > 0:
+                    # the last lines are gone, together with the line break before them
+                    textIterBegin = document.get_iter_at_line(lineBegin-1)
+                    textIterBegin.forward_to_line_end()
+            document.delete(textIterBegin, textIterEnd)
+            document.insert(textIterBegin, text)
+        document.end_user_action()
@@ -0,0 +1,146 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-window-management
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from gi.repository import Gtk, GLib, Gio
+
+from projectscanner import ProjectScanner
+
+# Bottom-panel that shows the results of a project scan while they come in.
+class ScanPanel:
+
+    def __init__(self, window):
+        self._window    = window
+        self._scanner   = None
+        self._scanId    = 0
+        self._directory = None
+
+        self._liststore = Gtk.ListStore(str, int, str)
+
+        self._progressbar = Gtk.ProgressBar()
+        self._progressbar.set_show_text(True)
+
+        self._buttonCancel = Gtk.Button("Cancel")
+        self._buttonCancel.set_sensitive(False)
+        self._buttonCancel.connect("clicked", self.on_cancel_clicked)
+
+        boxTop = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+        boxTop.pack_start(self._progressbar, True, True, 0)
+        boxTop.pack_start(self._buttonCancel, False, False, 0)
+
+        treeview = Gtk.TreeView(model=self._liststore)
+        for columnIndex, title in [[0, "File"], [1, "Line"], [2, "Message"]]:
+            column = Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=columnIndex)
+            column.set_resizable(True)
+            column.set_sort_column_id(columnIndex)
+            treeview.append_column(column)
+        treeview.connect("row-activated", self.on_row_activated)
+
+        scrolledWindow = Gtk.ScrolledWindow()
+        scrolledWindow.add(treeview)
+
+        self._widget = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
+        self._widget.pack_start(boxTop, False, False, 0)
+        self._widget.pack_start(scrolledWindow, True, True, 0)
+        self._widget.show_all()
+
+        panel = window.get_bottom_panel()
+        if hasattr(panel, "add_item"): # gedit 3.10
+            panel.add_item(self._widget, "AddiksHintsScanPanel", "Hints", None)
+        else:
+            panel.add_titled(self._widget, "AddiksHintsScanPanel", "Hints")
+
+    def remove(self):
+        self.cancel()
+        panel = self._window.get_bottom_panel()
+        if hasattr(panel, "remove_item"):
+            panel.remove_item(self._widget)
+        else:
+            panel.remove(self._widget)
+
+    def start(self, hint_manager, directory):
+        self.cancel()
+        self._liststore.clear()
+        self._progressbar.set_fraction(0)
+        self._progressbar.set_text("Searching files in " + directory)
+        self._buttonCancel.set_sensitive(True)
+
+        panel = self._window.get_bottom_panel()
+        panel.set_visible(True)
+        if hasattr(panel, "activate_item"):
+            panel.activate_item(self._widget)
+        else:
+            panel.set_visible_child(self._widget)
+
+        # results of an earlier, cancelled scan may still come in
+        self._scanId += 1
+        scanId = self._scanId
+
+        self._directory = directory
+        self._scanner = ProjectScanner(
+            hint_manager,
+            directory,
+            lambda filePath, hints: GLib.idle_add(self.__add_results, scanId, filePath, hints),
+            lambda done, total: GLib.idle_add(self.__show_progress, scanId, done, total),
+            lambda wasCancelled: GLib.idle_add(self.__finish, scanId, wasCancelled)
+        )
+        self._scanner.start()
+
+    def cancel(self):
+        if self._scanner != None:
+            self._scanner.cancel()
+            self._scanner = None
+            self._buttonCancel.set_sensitive(False)
+
+    def on_cancel_clicked(self, button):
+        self.cancel()
+        self._progressbar.set_text("Cancelled")
+
+    def on_row_activated(self, treeview, path, column):
+        treeIter = self._liststore.get_iter(path)
+        filePath = os.path.join(self._directory, self._liststore.get_value(treeIter, 0))
+        line     = self._liststore.get_value(treeIter, 1)
+        location = Gio.File.new_for_path(filePath)
+        tab = self._window.get_tab_from_location(location)
+        if tab == None:
+            self._window.create_tab_from_location(location, None, line, 0, False, True)
+        else:
+            self._window.set_active_tab(tab)
+            document = tab.get_document()
+            document.goto_line(line-1)
+            tab.get_view().scroll_to_cursor()
+
+    def __add_results(self, scanId, filePath, hints):
+        if scanId != self._scanId:
+            return False
+        relativePath = os.path.relpath(filePath, self._directory)
+        for hint in hints:
+            self._liststore.append([relativePath, hint.line_begin+1, hint.message])
+        return False
+
+    def __show_progress(self, scanId, done, total):
+        if scanId == self._scanId and self._scanner != None and total > 0:
+            self._progressbar.set_fraction(done / total)
+            self._progressbar.set_text("%d / %d files" % (done, total))
+        return False
+
+    def __finish(self, scanId, wasCancelled):
+        if scanId == self._scanId and not wasCancelled:
+            self._scanner = None
+            self._buttonCancel.set_sensitive(False)
+            self._progressbar.set_text("%d hints" % len(self._liststore))
+        return False
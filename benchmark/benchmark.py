@@ -0,0 +1,311 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+#
+# Headless benchmark of the hint pipeline (no gedit needed).
+#
+# Generates a corpus of synthetic PHP files and runs them through HintManager
+# with the stand-ins in benchmark/stubs/ for php, phpcs and phpmd, which answer
+# in the output formats of the real tools. Reports throughput and latency
+# percentiles per scenario:
+#
+#   python3 benchmark/benchmark.py [--files 200] [--big-lines 10000] [--json]
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+
+sys.path.insert(0, PLUGIN_DIR)
+
+from hint import Hint
+from hintmanager import HintManager, XMLReportReader
+
+# Answers the ruleset lookups AddiksHintsApp normally does from rulesets.csv
+class BenchmarkPlugin:
+
+    def __init__(self, phpmdRuleset):
+        self._phpmd_ruleset = phpmdRuleset
+
+    def get_phpcs_rulesets_for_file(self, filePath):
+        return ["PSR2"]
+
+    def get_phpmd_rulesets_for_file(self, filePath):
+        return [self._phpmd_ruleset]
+
+
+class Benchmark:
+
+    def __init__(self, fileCount, bigLines, seed=1):
+        self._file_count = fileCount
+        self._big_lines  = bigLines
+        self._random     = random.Random(seed)
+        self._work_dir   = tempfile.mkdtemp(prefix="addiks-hints-benchmark-")
+        self._files      = []
+        self._big_file   = None
+        self._results    = []
+
+        os.environ["PATH"] = STUB_DIR + os.pathsep + os.environ.get("PATH", "")
+
+        self._phpmd_ruleset = os.path.join(self._work_dir, "phpmd.xml")
+        with open(self._phpmd_ruleset, "w") as handle:
+            handle.write(
+                '<?xml version="1.0"?>\n<ruleset name="benchmark">\n'
+                '    <rule ref="rulesets/codesize.xml"/>\n'
+                '    <rule ref="rulesets/unusedcode.xml"/>\n'
+                '</ruleset>\n'
+            )
+
+    def run(self):
+        try:
+            self.__build_corpus()
+            self.bench_report_parsing()
+            self.bench_pipeline("cold, sequential", parallel=False)
+            self.bench_pipeline("cold, parallel", parallel=True)
+            self.bench_cache()
+            self.bench_project_index()
+            self.bench_incremental_lint(False)
+            self.bench_incremental_lint(True)
+            self.bench_scheduler()
+        finally:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+        return self._results
+
+    ### SCENARIOS
+
+    def bench_report_parsing(self):
+        # reports recorded once from the stand-ins, then parsed in-process only
+        for tool in ["phpcs", "phpmd"]:
+            reports = []
+            for filePath, content in self._files:
+                if tool == "phpcs":
+                    command = ["phpcs", "--report=xml", "--standard=PSR2", "--stdin-path="+filePath, "-"]
+                else:
+                    command = ["phpmd", filePath, "xml", self._phpmd_ruleset]
+                reports.append(subprocess.run(command, input=content, stdout=subprocess.PIPE).stdout)
+
+            latencies = []
+            findings = 0
+            for report in reports:
+                begin = time.perf_counter()
+                for element in XMLReportReader().read_bytes(report):
+                    lineNumber = element.attrib.get('line', element.attrib.get('beginline'))
+                    Hint(int(lineNumber)-1, int(lineNumber)-1, 0, 1, element.text.strip(), "#A5A5A5", 100, "PSR2")
+                    findings += 1
+                latencies.append(time.perf_counter() - begin)
+            self.__add_result("parse %s reports" % tool, latencies, "%d findings, %d KiB" % (
+                findings, sum(len(report) for report in reports) // 1024))
+
+    def bench_pipeline(self, title, parallel):
+        hintManager = self.__create_hint_manager(parallel=parallel)
+        latencies = []
+        hintCount = 0
+        for filePath, content in self._files:
+            begin = time.perf_counter()
+            hints = hintManager.get_hints_by_file(filePath, content.decode())
+            latencies.append(time.perf_counter() - begin)
+            hintCount += len(hints)
+        hintManager.shutdown()
+        self.__add_result("pipeline " + title, latencies, "%d hints" % hintCount)
+
+    def bench_cache(self):
+        hintManager = self.__create_hint_manager(cacheEntries=len(self._files) * 3)
+        for filePath, content in self._files:
+            hintManager.get_hints_by_file(filePath, content.decode())
+        latencies = []
+        for filePath, content in self._files:
+            begin = time.perf_counter()
+            hintManager.get_hints_by_file(filePath, content.decode())
+            latencies.append(time.perf_counter() - begin)
+        hintManager.shutdown()
+        self.__add_result("pipeline, cache hits", latencies)
+
+    def bench_project_index(self):
+        dataDir = os.path.join(self._work_dir, "index-data")
+        hintManager = self.__create_hint_manager(useIndex=True, dataDir=dataDir)
+        for filePath, content in self._files:
+            hintManager.get_hints_by_file(filePath)
+        hintManager.shutdown()
+
+        # a fresh manager, as after restarting gedit
+        hintManager = self.__create_hint_manager(useIndex=True, dataDir=dataDir)
+        latencies = []
+        for filePath, content in self._files:
+            begin = time.perf_counter()
+            hintManager.get_hints_by_file(filePath)
+            latencies.append(time.perf_counter() - begin)
+        hintManager.shutdown()
+        self.__add_result("project index, unchanged files", latencies)
+
+    def bench_incremental_lint(self, incremental):
+        filePath = os.path.join(self._work_dir, "Big.php")
+        lines = self._big_file.split("\n")
+
+        hintManager = self.__create_hint_manager(adapters=['phplint'], incremental=incremental)
+        hintManager.get_hints_by_file(filePath, "\n".join(lines))
+
+        # typing in the middle of one method
+        editLine = len(lines) // 2
+        while not lines[editLine].startswith("        $value"):
+            editLine += 1
+        latencies = []
+        for edit in range(50):
+            lines[editLine] = lines[editLine].rstrip(";") + " + %d;" % edit
+            begin = time.perf_counter()
+            hintManager.get_hints_by_file(filePath, "\n".join(lines))
+            latencies.append(time.perf_counter() - begin)
+        hintManager.shutdown()
+
+        title = "phplint %d lines, %s" % (len(lines), "incremental" if incremental else "full parse")
+        self.__add_result(title, latencies)
+
+    def bench_scheduler(self):
+        try:
+            from gi.repository import GLib
+            from hintscheduler import HintScheduler
+        except ImportError as error:
+            print("skipping scheduler benchmark: %s" % error, file=sys.stderr)
+            return
+
+        hintManager = self.__create_hint_manager()
+        scheduler = HintScheduler(max_jobs=2)
+        mainLoop = GLib.MainLoop()
+        latencies = []
+        pending = [len(self._files)]
+
+        def schedule(filePath, content):
+            begin = time.perf_counter()
+            def done(hints):
+                latencies.append(time.perf_counter() - begin)
+                pending[0] -= 1
+                if pending[0] <= 0:
+                    mainLoop.quit()
+            scheduler.schedule(filePath, lambda: hintManager.get_hints_by_file(filePath, content.decode()), done)
+
+        for filePath, content in self._files:
+            schedule(filePath, content)
+        mainLoop.run()
+        scheduler.shutdown()
+        hintManager.shutdown()
+        self.__add_result("scheduler, %d files queued" % len(self._files), latencies)
+
+    ### HELPERS
+
+    def __create_hint_manager(self, parallel=True, cacheEntries=0, useIndex=False, incremental=False,
+                              adapters=('phplint', 'phpmd', 'phpcs'), dataDir=None):
+        if dataDir == None:
+            dataDir = tempfile.mkdtemp(dir=self._work_dir)
+        hintManager = HintManager(BenchmarkPlugin(self._phpmd_ruleset), dataDir)
+        for adapterName in adapters:
+            hintManager.set_adapter_state(adapterName, True)
+        hintManager.set_parallel_mode(parallel)
+        hintManager.set_cache_limits(cacheEntries, 64*1024*1024, False)
+        hintManager.set_project_index_mode(useIndex)
+        hintManager.set_lint_worker_mode(True, incremental)
+        return hintManager
+
+    def __build_corpus(self):
+        corpusDir = os.path.join(self._work_dir, "corpus")
+        os.makedirs(corpusDir)
+        for index in range(self._file_count):
+            filePath = os.path.join(corpusDir, "Class%d.php" % index)
+            content = self.__generate_file(self._random.choice([40, 150, 400, 1200])).encode()
+            with open(filePath, "wb") as handle:
+                handle.write(content)
+            self._files.append([filePath, content])
+        self._big_file = self.__generate_file(self._big_lines)
+
+    def __generate_file(self, lineCount):
+        lines = ["<?php", "", "namespace Benchmark\\Generated;", ""]
+        classIndex = 0
+        while len(lines) < lineCount:
+            lines += ["/**", " * Generated class %d" % classIndex, " */", "class Generated%d" % classIndex, "{"]
+            for methodIndex in range(self._random.randint(2, 8)):
+                parameterCount = self._random.randint(0, 6)
+                parameters = ", ".join("$p%d" % number for number in range(parameterCount))
+                lines += ["    public function method%d(%s)" % (methodIndex, parameters), "    {"]
+                for statementIndex in range(self._random.randint(2, 12)):
+                    choice = self._random.random()
+                    if choice < 0.05:
+                        lines.append("        $unused%d = 1;" % statementIndex)
+                    elif choice < 0.10:
+                        lines.append("        $value = 1; ")
+                    elif choice < 0.15:
+                        lines.append("\t\t$value = 2;")
+                    elif choice < 0.20:
+                        lines.append("        $value = '" + "x" * 130 + "';")
+                    else:
+                        lines.append("        $value%d = %d;" % (statementIndex, statementIndex))
+                lines += ["    }", ""]
+            lines += ["}", ""]
+            classIndex += 1
+        return "\n".join(lines)
+
+    def __add_result(self, title, latencies, note=""):
+        latencies = sorted(latencies)
+        total = sum(latencies)
+        self._results.append({
+            'scenario': title,
+            'count':    len(latencies),
+            'total_s':  total,
+            'per_s':    len(latencies) / total if total > 0 else None,
+            'p50_ms':   self.__percentile(latencies, 50) * 1000,
+            'p95_ms':   self.__percentile(latencies, 95) * 1000,
+            'max_ms':   latencies[-1] * 1000 if len(latencies) > 0 else 0.0,
+            'note':     note,
+        })
+
+    def __percentile(self, sortedValues, percent):
+        # nearest rank
+        if len(sortedValues) <= 0:
+            return 0.0
+        rank = max(1, -(-len(sortedValues) * percent // 100))
+        return sortedValues[int(rank) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hint pipeline without gedit.")
+    parser.add_argument("--files", type=int, default=200, help="number of generated PHP files")
+    parser.add_argument("--big-lines", type=int, default=10000, help="lines of the file used for incremental linting")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    arguments = parser.parse_args()
+
+    results = Benchmark(arguments.files, arguments.big_lines, arguments.seed).run()
+
+    if arguments.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print("%-40s %6s %9s %9s %9s %9s %9s  %s" % ("scenario", "count", "total s", "per s", "p50 ms", "p95 ms", "max ms", ""))
+    for result in results:
+        perSecond = "-"
+        if result['per_s'] != None:
+            perSecond = "%.1f" % result['per_s']
+        print("%-40s %6d %9.3f %9s %9.2f %9.2f %9.2f  %s" % (
+            result['scenario'], result['count'], result['total_s'], perSecond,
+            result['p50_ms'], result['p95_ms'], result['max_ms'], result['note']))
+
+if __name__ == "__main__":
+    main()
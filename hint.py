@@ -0,0 +1,68 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+
+# One finding of a checker, lines and columns 0-based.
+# Views of big files hold thousands of these, so they use __slots__ and share
+# their strings: messages, colors and rulesets are interned.
+class Hint:
+
+    __slots__ = (
+        'line_begin', 'line_end', 'column_begin', 'column_end',
+        'message', 'color', 'priority', 'ruleset',
+    )
+
+    def __init__(self, lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority, ruleset=None):
+        self.line_begin   = int(lineBegin)
+        self.line_end     = int(lineEnd)
+        self.column_begin = int(columnBegin)
+        self.column_end   = int(columnEnd)
+        self.message      = sys.intern(message)
+        self.color        = sys.intern(color)
+        self.priority     = priority
+        self.ruleset      = None
+        if ruleset != None:
+            self.ruleset  = sys.intern(ruleset)
+
+    @staticmethod
+    def from_list(row):
+        return Hint(*row)
+
+    def to_list(self):
+        return [
+            self.line_begin, self.line_end, self.column_begin, self.column_end,
+            self.message, self.color, self.priority, self.ruleset
+        ]
+
+    def shifted(self, lineDelta):
+        return Hint(
+            self.line_begin + lineDelta, self.line_end + lineDelta, self.column_begin, self.column_end,
+            self.message, self.color, self.priority, self.ruleset
+        )
+
+    def __iter__(self):
+        # lineBegin, lineEnd, columnBegin, columnEnd, message, color, priority, ruleset = hint
+        return iter(self.to_list())
+
+    def __eq__(self, other):
+        return isinstance(other, Hint) and self.to_list() == other.to_list()
+
+    def __hash__(self):
+        return hash((self.line_begin, self.line_end, self.column_begin, self.column_end, self.message))
+
+    def __repr__(self):
+        return "Hint(%r)" % self.to_list()
@@ -0,0 +1,134 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+from hint import Hint
+
+# Part of every key; bump whenever the layout of the cached hints changes.
+CACHE_FORMAT = "3"
+
+class HintCache:
+
+    def __init__(self, data_dir, max_entries=512, max_bytes=16*1024*1024, persistent=True):
+        self._data_dir    = data_dir
+        self._max_entries = max_entries
+        self._max_bytes   = max_bytes
+        self._persistent  = persistent
+        self._entries     = OrderedDict() # key => [hints, size]
+        self._bytes       = 0
+        self._loaded      = False
+        self._dirty       = False
+        self._lock        = Lock()
+
+    @staticmethod
+    def hash_content(content):
+        return hashlib.sha1(content).hexdigest()
+
+    @staticmethod
+    def build_key(contentHash, adapterName, suffix, rulesets, filePath):
+        rulesetParts = []
+        for rulesetFilepath in rulesets:
+            mtime = 0
+            if os.path.exists(rulesetFilepath):
+                mtime = os.path.getmtime(rulesetFilepath)
+            rulesetParts.append("%s@%s" % (rulesetFilepath, mtime))
+        # the path matters too: exclude-patterns and sniffs like ClassFileName look at it
+        return "|".join([CACHE_FORMAT, adapterName, suffix, contentHash, filePath] + rulesetParts)
+
+    def set_limits(self, max_entries, max_bytes, persistent):
+        with self._lock:
+            self._max_entries = max_entries
+            self._max_bytes   = max_bytes
+            self._persistent  = persistent
+            self.__evict()
+
+    def get(self, key):
+        with self._lock:
+            self.__load()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            hints, size = self._entries[key]
+            return list(hints)
+
+    def put(self, key, hints):
+        hints = tuple(hints)
+        size = len(key) + len(json.dumps([hint.to_list() for hint in hints]))
+        with self._lock:
+            self.__load()
+            if key in self._entries:
+                self._bytes -= self._entries[key][1]
+            self._entries[key] = [hints, size]
+            self._entries.move_to_end(key)
+            self._bytes += size
+            self._dirty = True
+            self.__evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._persistent or not self._dirty:
+                return
+            path = self.get_cache_file()
+            entries = []
+            for key in self._entries:
+                entries.append([key, [hint.to_list() for hint in self._entries[key][0]]])
+            try:
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path + ".tmp", "w") as handle:
+                    json.dump(entries, handle)
+                os.replace(path + ".tmp", path)
+                self._dirty = False
+            except OSError as error:
+                print(error)
+
+    def get_cache_file(self):
+        return os.path.join(self._data_dir, "cache", "hints.json")
+
+    def __load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        path = self.get_cache_file()
+        if not self._persistent or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as handle:
+                entries = json.load(handle)
+            for key, hints in entries:
+                size = len(key) + len(json.dumps(hints))
+                self._entries[key] = [tuple(Hint.from_list(hint) for hint in hints), size]
+                self._bytes += size
+            self.__evict()
+        except (OSError, ValueError, TypeError) as error:
+            print(error)
+
+    def __evict(self):
+        while len(self._entries) > 0 and (
+            len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[1]
+            self._dirty = True
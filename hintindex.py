@@ -0,0 +1,58 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Hints longer than this many lines are not spread over the per-line buckets.
+MAX_BUCKETED_SPAN = 64
+
+# Line-keyed lookup of hints by buffer position, built once per hint update.
+# Every hint is put into the bucket of each line it covers, so a lookup costs
+# one dict access plus the hints on that line. The few very long hints
+# (e.g. a syntax error spanning half the file) are kept in a separate list.
+class HintIndex:
+
+    def __init__(self, hints=()):
+        self._lines = {}
+        self._long_hints = []
+
+        for hint in hints:
+            if hint.line_end - hint.line_begin > MAX_BUCKETED_SPAN:
+                self._long_hints.append(hint)
+                continue
+            for line in range(hint.line_begin, hint.line_end+1):
+                if line not in self._lines:
+                    self._lines[line] = []
+                self._lines[line].append(hint)
+
+    def has_hints_at(self, line, column):
+        for hint in self._lines.get(line, ()):
+            if column >= hint.column_begin and column <= hint.column_end:
+                return True
+        for hint in self._long_hints:
+            if (line >= hint.line_begin and line <= hint.line_end and
+                column >= hint.column_begin and column <= hint.column_end):
+                return True
+        return False
+
+    def get_messages_at(self, line, column):
+        messages = []
+        for hint in self._lines.get(line, ()):
+            if column >= hint.column_begin and column <= hint.column_end:
+                messages.append(hint.message)
+        for hint in self._long_hints:
+            if (line >= hint.line_begin and line <= hint.line_end and
+                column >= hint.column_begin and column <= hint.column_end):
+                messages.append(hint.message)
+        return messages
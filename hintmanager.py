@@ -1,20 +1,41 @@
 
 import re
 import os
+import signal
+import resource
 import subprocess
 import tempfile
 from subprocess import Popen, PIPE
 import xml.etree.ElementTree as ET
+from threading import Lock, Timer
+from concurrent.futures import ThreadPoolExecutor, wait
+from hint import Hint
+from hintcache import HintCache
+from hintstats import AdapterRun, HintStats
+from projectindex import ProjectIndex
+from phplintworker import PHPLintWorker
+from incrementallint import IncrementalLint
+from toolserver import ToolServerPool
+
+ADAPTER_NAMES = ['phplint', 'phpmd', 'phpcs']
 
 class HintManager:
 
     def __init__(self, plugin, data_dir):
-        self._adapters = {
-            'phplint': PHPLintAdapter(plugin, data_dir),
-            'phpmd':   PHPMDAdapter(plugin, data_dir),
-            'phpcs':   PHPCSAdapter(plugin, data_dir),
-        }
+        self._plugin = plugin
+        self._data_dir = data_dir
+        self._adapters = {} # only the adapters that were needed so far
+        self._adapter_lock = Lock()
+        self._adapter_limits = {}
+        self._lint_worker_mode = [True, True]
+        self._tool_server_mode = [False, 300, 512]
         self._active_adapters = []
+        self._parallel = True
+        self._max_workers = len(ADAPTER_NAMES)
+        self._executor = None
+        self._cache = HintCache(data_dir)
+        self._index = ProjectIndex(data_dir)
+        self._stats = HintStats(data_dir)
 
     def set_adapter_state(self, name, is_active):
         if is_active and name not in self._active_adapters:
@@ -22,157 +43,832 @@ class HintManager:
         elif not is_active and name in self._active_adapters:
             self._active_adapters.remove(name)
 
+    def set_parallel_mode(self, is_parallel, max_workers=None):
+        self._parallel = is_parallel
+        if max_workers != None and max_workers > 0 and max_workers != self._max_workers:
+            self._max_workers = max_workers
+            # running jobs finish on the old pool, the next ones get the new size
+            if self._executor != None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def set_cache_limits(self, max_entries, max_bytes, persistent=True):
+        self._cache.set_limits(max_entries, max_bytes, persistent)
+
+    def set_project_index_mode(self, use_index):
+        self._index.set_enabled(use_index)
+
+    def set_stats_log_mode(self, use_log):
+        self._stats.set_log_enabled(use_log)
+
+    def get_stats(self):
+        return self._stats
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._index.clear()
+
+    def set_lint_worker_mode(self, use_worker, use_incremental=True):
+        self._lint_worker_mode = [use_worker, use_incremental]
+        if 'phplint' in self._adapters:
+            self._adapters['phplint'].set_worker_mode(use_worker)
+            self._adapters['phplint'].set_incremental_mode(use_incremental)
+
+    def set_adapter_limits(self, name, timeout, memory_limit=1024, cpu_limit=60):
+        self._adapter_limits[name] = ToolLimits(timeout, memory_limit, cpu_limit)
+        if name in self._adapters:
+            self._adapters[name].set_limits(self._adapter_limits[name])
+
+    def set_tool_server_mode(self, use_servers, idle_timeout=300, memory_limit=512):
+        self._tool_server_mode = [use_servers, idle_timeout, memory_limit]
+        for adapterName in ['phpmd', 'phpcs']:
+            if adapterName in self._adapters:
+                self._adapters[adapterName].set_server_mode(use_servers, idle_timeout, memory_limit)
+
+    def shutdown(self):
+        self._cache.save()
+        self._index.close()
+        self._stats.close()
+        for adapterName in list(self._adapters):
+            self._adapters[adapterName].shutdown()
+        if self._executor != None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor == None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="addiks-hints"
+            )
+        return self._executor
+
     def get_all_adapter_names(self):
         names = []
-        for adapterName in self._adapters:
+        for adapterName in ADAPTER_NAMES:
             names.append(adapterName)
         return names
 
-    def get_hints_by_file(self, filepath, content=None):
+    def get_hints_by_file(self, filepath, content=None, cancellable=None, parallel=True):
+        # parallel=False runs the adapters in the calling thread, for callers that
+        # bring their own pool and should not queue up in front of the editor's checks
         hints = []
 
+        if cancellable == None:
+            cancellable = Cancellable()
+
         suffix = "tmp"
         if "." in filepath:
             suffix = filepath.split(".")[-1]
 
-        tempFile = tempfile.NamedTemporaryFile(suffix="."+suffix, delete=False)
+        fileData = None
+        fileStat = None
+        contentHash = None
 
         if content == None:
-            with open(filepath) as fileHandle:
-                fileData = fileHandle.read()
-                tempFile.file.write(fileData)
+            # an unmodified file is known to the index without reading it
+            fileStat = ProjectIndex.stat_file(filepath)
+            contentHash = self._index.get_content_hash(filepath, fileStat)
 
         else:
-            tempFile.file.write(bytes(content, 'UTF-8'))
+            fileData = bytes(content, 'UTF-8')
+
+        if contentHash == None:
+            if fileData == None:
+                with open(filepath, "rb") as fileHandle:
+                    fileData = fileHandle.read()
+            contentHash = HintCache.hash_content(fileData)
+
+        adapters = []
+        for adapterName, adapter, ruleset, cacheKey, cachedHints in self.__lookup(filepath, contentHash, suffix):
+            run = AdapterRun(adapterName, ruleset, filepath)
+            if cachedHints != None:
+                run.cache_hit = True
+                run.finish(cachedHints)
+                self._stats.record(run)
+                hints = hints + cachedHints
+            else:
+                adapters.append([adapterName, adapter, cacheKey, run])
+
+        if len(adapters) > 0:
+            if fileData == None:
+                with open(filepath, "rb") as fileHandle:
+                    fileData = fileHandle.read()
+                if HintCache.hash_content(fileData) != contentHash:
+                    # changed on disk without touching mtime or size; the keys are wrong
+                    self._index.forget(filepath)
+                    return self.get_hints_by_file(filepath, content, cancellable, parallel)
+
+            source = ContentSource(fileData, suffix, cancellable)
+            futures = []
+            try:
+                if self._parallel and parallel and len(adapters) > 1:
+                    # all adapters are bound by their external process, threads are enough here
+                    executor = self._get_executor()
+                    for adapterName, adapter, cacheKey, run in adapters:
+                        futures.append([
+                            executor.submit(self.__run_adapter, adapter, source, filepath, run),
+                            adapterName,
+                            cacheKey,
+                            run
+                        ])
+                    for future, adapterName, cacheKey, run in futures:
+                        newHints = future.result()
+                        if not cancellable.is_cancelled() and not run.timed_out and not run.failed:
+                            self._cache.put(cacheKey, newHints)
+                            self._index.put(filepath, fileStat, contentHash, adapterName, cacheKey, newHints)
+                        hints = hints + newHints
+
+                else:
+                    for adapterName, adapter, cacheKey, run in adapters:
+                        if cancellable.is_cancelled():
+                            break
+                        newHints = self.__run_adapter(adapter, source, filepath, run)
+                        if not cancellable.is_cancelled() and not run.timed_out and not run.failed:
+                            self._cache.put(cacheKey, newHints)
+                            self._index.put(filepath, fileStat, contentHash, adapterName, cacheKey, newHints)
+                        hints = hints + newHints
+            finally:
+                # a failing adapter must not leave the content copy behind in /dev/shm,
+                # nor should it be removed while other adapters still read it
+                wait([entry[0] for entry in futures])
+                source.cleanup()
+
+        if cancellable.is_cancelled():
+            return None
+
+        hints = sorted(hints, key=lambda hint: hint.priority)
 
-        tempFilePath = tempFile.name
-        tempFile.close()
+        return hints
 
-        for adapterName in self._adapters:
-            if adapterName in self._active_adapters:
-                adapter = self._adapters[adapterName]
-                newHints = adapter.get_hints_by_file(tempFile.name, filepath)
-                hints = hints + newHints
+    def get_fixed_content(self, filepath, content, cancellable=None):
+        # => the content with everything phpcbf can fix fixed, or None
+        if cancellable == None:
+            cancellable = Cancellable()
+        fixedData = self.__get_adapter('phpcs').get_fixed_content(filepath, bytes(content, 'UTF-8'), cancellable)
+        if fixedData == None:
+            return None
+        return str(fixedData, 'UTF-8')
+
+    def get_cached_hints(self, filepath, content):
+        # => the hints for that content if no checker would have to run for them, else None
+        suffix = "tmp"
+        if "." in filepath:
+            suffix = filepath.split(".")[-1]
+
+        contentHash = HintCache.hash_content(bytes(content, 'UTF-8'))
 
-        os.remove(tempFilePath)
+        hints = []
+        for adapterName, adapter, ruleset, cacheKey, cachedHints in self.__lookup(filepath, contentHash, suffix):
+            if cachedHints == None:
+                return None
+            hints = hints + cachedHints
 
-        hints = sorted(hints, key=lambda row: row[6])
+        return sorted(hints, key=lambda hint: hint.priority)
 
+    def __lookup(self, filepath, contentHash, suffix):
+        # => [[adapterName, adapter, ruleset, cacheKey, cachedHints or None], ...] of the active adapters
+        found = []
+        for adapterName in ADAPTER_NAMES:
+            if adapterName in self._active_adapters:
+                adapter = self.__get_adapter(adapterName)
+                rulesets = adapter.get_rulesets_for_file(filepath)
+                cacheKey = HintCache.build_key(contentHash, adapterName, suffix, rulesets, filepath)
+                cachedHints = self._cache.get(cacheKey)
+                if cachedHints == None:
+                    cachedHints = self._index.get(filepath, adapterName, cacheKey)
+                    if cachedHints != None:
+                        self._cache.put(cacheKey, cachedHints)
+                found.append([adapterName, adapter, ",".join(rulesets) or None, cacheKey, cachedHints])
+        return found
+
+    def __get_adapter(self, name):
+        # built on first use, so a checker that is switched off costs nothing
+        with self._adapter_lock:
+            if name not in self._adapters:
+                if name == 'phplint':
+                    adapter = PHPLintAdapter(self._plugin, self._data_dir)
+                    adapter.set_worker_mode(self._lint_worker_mode[0])
+                    adapter.set_incremental_mode(self._lint_worker_mode[1])
+                else:
+                    if name == 'phpmd':
+                        adapter = PHPMDAdapter(self._plugin, self._data_dir)
+                    else:
+                        adapter = PHPCSAdapter(self._plugin, self._data_dir)
+                    adapter.set_server_mode(*self._tool_server_mode)
+                if name in self._adapter_limits:
+                    adapter.set_limits(self._adapter_limits[name])
+                self._adapters[name] = adapter
+            return self._adapters[name]
+
+    def __run_adapter(self, adapter, source, filepath, run):
+        run.start()
+        hints = adapter.get_hints_by_file(source, filepath, run)
+        run.finish(hints, source.cancellable.is_cancelled())
+        self._stats.record(run)
         return hints
 
 
+# Lets a caller abort a hint run; all tool processes of the run get killed.
+class Cancellable:
+
+    def __init__(self):
+        self._cancelled = False
+        self._processes = []
+        self._lock = Lock()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            processes = self._processes
+            self._processes = []
+        for process in processes:
+            self.kill_process(process)
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def register_process(self, process):
+        with self._lock:
+            if not self._cancelled:
+                self._processes.append(process)
+                return
+        self.kill_process(process)
+
+    def unregister_process(self, process):
+        with self._lock:
+            if process in self._processes:
+                self._processes.remove(process)
+
+    @staticmethod
+    def kill_process(process):
+        # tools are started in their own session, so this also kills whatever they spawned
+        if process.poll() == None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                process.kill()
+
+
+# The content to check, given to the tools via stdin wherever possible.
+# Tools that can only read files get a temporary copy, preferably on a tmpfs.
+class ContentSource:
+
+    def __init__(self, data, suffix, cancellable):
+        self.data = data
+        self.cancellable = cancellable
+        self._suffix = suffix
+        self._temp_path = None
+        self._lock = Lock()
+
+    def get_temp_path(self):
+        with self._lock:
+            if self._temp_path == None:
+                tempFile = tempfile.NamedTemporaryFile(
+                    suffix="."+self._suffix,
+                    dir=self.__get_tmpfs_dir(),
+                    delete=False
+                )
+                tempFile.file.write(self.data)
+                tempFile.close()
+                self._temp_path = tempFile.name
+            return self._temp_path
+
+    def cleanup(self):
+        with self._lock:
+            if self._temp_path != None:
+                os.remove(self._temp_path)
+                self._temp_path = None
+
+    def __get_tmpfs_dir(self):
+        for directory in [os.environ.get("XDG_RUNTIME_DIR"), "/dev/shm"]:
+            if directory != None and os.path.isdir(directory) and os.access(directory, os.W_OK):
+                return directory
+        return None
+
+
+# Timeout and resource limits for the tool processes of one adapter (0 = no limit).
+# Memory (address space, MiB) and CPU time (seconds) are capped with prlimit from
+# the outside, right after the spawn: a preexec_fn would run Python in the forked
+# child, which can deadlock while other threads spawn too and rules out the
+# posix_spawn path of subprocess. The timeout is enforced by killing the process
+# group of the tool.
+class ToolLimits:
+
+    def __init__(self, timeout=30, memoryLimit=1024, cpuLimit=60):
+        self.timeout = timeout
+        self.memory_limit = memoryLimit
+        self.cpu_limit = cpuLimit
+
+    def apply(self, process, limitCpu=True):
+        # limitCpu=False for resident processes, their cpu time adds up over many requests
+        try:
+            if self.memory_limit > 0:
+                memoryBytes = self.memory_limit * 1024 * 1024
+                resource.prlimit(process.pid, resource.RLIMIT_AS, (memoryBytes, memoryBytes))
+            if self.cpu_limit > 0 and limitCpu:
+                resource.prlimit(process.pid, resource.RLIMIT_CPU, (self.cpu_limit, self.cpu_limit))
+        except ProcessLookupError:
+            pass # already done
+        except (OSError, ValueError) as error:
+            print(error)
+
+    def watch(self, process, run):
+        # limits a freshly started tool process and kills it once it runs too long
+        self.apply(process)
+        watch = ProcessWatch(process, run)
+        if self.timeout > 0:
+            watch.start(self.timeout)
+        return watch
+
+    def create_timeout_hint(self, tool, color, priority, ruleset=None):
+        return Hint(0, 0, 0, 1, "%s timed out after %s seconds" % (tool, self.timeout), color, priority, ruleset)
+
+
+# Kills a tool process (and whatever it started) once it ran for too long.
+class ProcessWatch:
+
+    def __init__(self, process, run):
+        self._process = process
+        self._run = run
+        self._timer = None
+
+    def start(self, timeout):
+        self._timer = Timer(timeout, self.__expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        if self._timer != None:
+            self._timer.cancel()
+            self._timer = None
+
+    def __expire(self):
+        self._run.timed_out = True
+        Cancellable.kill_process(self._process)
+
+
 class PHPLintAdapter:
 
     def __init__(self, plugin, data_dir):
-        pass
-
-    def get_hints_by_file(self, filepath, filepathReal):
+        self._use_worker = True
+        self._worker = None
+        self._incremental = None
+        self._limits = ToolLimits()
+
+    def set_worker_mode(self, use_worker):
+        self._use_worker = use_worker
+        if not use_worker:
+            self.shutdown()
+
+    def set_limits(self, limits):
+        self._limits = limits
+        if self._worker != None:
+            self._worker.set_limits(limits)
+
+    def set_incremental_mode(self, use_incremental):
+        if use_incremental and self._incremental == None:
+            self._incremental = IncrementalLint()
+        elif not use_incremental:
+            self._incremental = None
+
+    def shutdown(self):
+        if self._worker != None:
+            self._worker.shutdown()
+            self._worker = None
+        if self._incremental != None:
+            self._incremental.clear()
+
+    def get_rulesets_for_file(self, filepathReal):
+        return []
+
+    def get_hints_by_file(self, source, filepathReal, run=None):
         hints = []
 
+        if run == None:
+            run = AdapterRun('phplint', None, filepathReal)
+
         if filepathReal[-4:]!='.php':
             return hints
 
         plugin_path = os.path.dirname(__file__)
 
-        color = "#FF0000"
-
         try:
-            sp = subprocess.Popen(["/usr/bin/env", "php", plugin_path+"/PHP-Parser/bin/php-parse.php", "-c", "--no-dump", filepath],
-                stdin=PIPE, stdout=PIPE, stderr=PIPE
-            )
-            sp.wait()
-            output, err = sp.communicate()
-            output = output.decode()
-            lines = output.split("\n")
-            pattern = re.compile("(\=+\> )?(.*) from (\d+)\:(\d+) to (\d+)\:(\d+)")
-            for line in lines:
-                match = pattern.match(line)
-                if match != None:
-                    message, lineBegin, columnBegin, lineEnd, columnEnd = match.group(2, 3, 4, 5, 6)
-                    lineBegin = int(lineBegin)-1
-                    lineEnd = int(lineEnd)-1
-                    columnBegin = int(columnBegin)-1
-                    columnEnd = int(columnEnd)
-                    hints.append([lineBegin, lineEnd, columnBegin, columnEnd, message, color, 300])
+            result = None
+
+            if self._use_worker and os.path.exists(plugin_path+"/php-parse-worker.php"):
+                if self._worker == None:
+                    self._worker = PHPLintWorker(
+                        ["/usr/bin/env", "php", plugin_path+"/php-parse-worker.php"],
+                        self._limits
+                    )
+                if self._incremental != None:
+                    # only the syntax check can be done on parts of a file
+                    workerHints = self._incremental.lint(
+                        filepathReal,
+                        source.data,
+                        lambda content: self.__check_with_worker(content, run)
+                    )
+                    if workerHints != None:
+                        result = [workerHints, None]
+                else:
+                    result = self.__check_with_worker(source.data, run)
+
+            if result == None:
+                sp = run.popen(["/usr/bin/env", "php", plugin_path+"/PHP-Parser/bin/php-parse.php", "-c", "--no-dump", source.get_temp_path()],
+                    stdin=subprocess.DEVNULL, stdout=PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+                )
+                source.cancellable.register_process(sp)
+                watch = self._limits.watch(sp, run)
+                try:
+                    output = sp.stdout.read()
+                finally:
+                    watch.stop()
+                    sp.stdout.close()
+                    run.wait(sp)
+                    source.cancellable.unregister_process(sp)
+                run.add_output(len(output))
+                result = self.__parse_report(output.decode())
+
+            if source.cancellable.is_cancelled():
+                return hints
+
+            hints = result[0]
+        except TimeoutError as error:
+            # the lint worker got killed; a full parse would hang just the same
+            print(error)
+            run.timed_out = True
         except OSError as error:
             print(error)
+            run.failed = True
 
+        if run.timed_out and not source.cancellable.is_cancelled():
+            return [self._limits.create_timeout_hint("php-parse", "#FF0000", 300)]
         return hints
 
-class PHPMDAdapter:
+    def __check_with_worker(self, content, run):
+        output = self._worker.check(content)
+        if output == None:
+            return None
+        run.add_output(len(output))
+        return self.__parse_report(output)
+
+    def __parse_report(self, output):
+        # => [hints, statements]; statements are only reported by php-parse-worker.php
+        hints = []
+        statements = None
+        color = "#FF0000"
+        pattern = re.compile("(\=+\> )?(.*) from (\d+)\:(\d+) to (\d+)\:(\d+)")
+        statementPattern = re.compile("statement (declaration|other) (\d+) (\d+)$")
+        for line in output.split("\n"):
+            match = statementPattern.match(line)
+            if match != None:
+                if statements == None:
+                    statements = []
+                kind, lineBegin, lineEnd = match.group(1, 2, 3)
+                statements.append([kind == "declaration", int(lineBegin)-1, int(lineEnd)-1])
+                continue
+            match = pattern.match(line)
+            if match != None:
+                message, lineBegin, columnBegin, lineEnd, columnEnd = match.group(2, 3, 4, 5, 6)
+                lineBegin = int(lineBegin)-1
+                lineEnd = int(lineEnd)-1
+                columnBegin = int(columnBegin)-1
+                columnEnd = int(columnEnd)
+                hints.append(Hint(lineBegin, lineEnd, columnBegin, columnEnd, message, color, 300, None))
+        return [hints, statements]
+
+# Finds out which of several rulesets checked in one run a finding came from.
+# Every ruleset is reduced to the names it refers to (standards and sniffs for
+# phpcs, rule-sets and rules for phpmd); a finding is attributed to the first
+# ruleset mentioning one of its names, or to all of them if none does.
+# The rulesets get resolved once per tool run, not per finding.
+class RulesetAttribution:
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+        self._tokens = {} # rulesetFilepath => [mtime, tokens]
+        self._lock = Lock()
+
+    def resolve(self, rulesets):
+        # => [[rulesetFilepath, tokens], ...]; a single ruleset needs no tokens
+        if len(rulesets) == 1:
+            return [[rulesets[0], None]]
+        resolved = []
+        for rulesetFilepath in rulesets:
+            resolved.append([rulesetFilepath, self.__get_tokens(rulesetFilepath)])
+        return resolved
+
+    def attribute(self, resolved, names):
+        if len(resolved) == 1:
+            return resolved[0][0]
+        for rulesetFilepath, tokens in resolved:
+            for name in names:
+                if name in tokens:
+                    return rulesetFilepath
+        return ",".join([entry[0] for entry in resolved])
+
+    def __get_tokens(self, rulesetFilepath):
+        mtime = None
+        if os.path.isfile(rulesetFilepath):
+            mtime = os.path.getmtime(rulesetFilepath)
+        with self._lock:
+            if rulesetFilepath in self._tokens and self._tokens[rulesetFilepath][0] == mtime:
+                return self._tokens[rulesetFilepath][1]
+        tokens = set([rulesetFilepath])
+        if mtime != None:
+            try:
+                rootXml = ET.parse(rulesetFilepath).getroot()
+                if 'name' in rootXml.attrib:
+                    tokens.add(rootXml.attrib['name'])
+                for ruleXml in rootXml.iter():
+                    if ruleXml.tag.split("}")[-1] == 'rule':
+                        tokens.update(self._tokenizer(ruleXml.attrib))
+            except (OSError, ET.ParseError) as error:
+                print(error)
+        with self._lock:
+            self._tokens[rulesetFilepath] = [mtime, tokens]
+        return tokens
+
+
+# Parses the XML report of phpcs or phpmd while it is being read.
+# The findings (the children of a <file> element) are handed out one by one and
+# dropped right after, so memory use does not grow with the size of the report.
+class XMLReportReader:
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._parents = []
+        self._has_data = False
+        self.bytes_read = 0
+
+    def read_stream(self, stream):
+        fd = stream.fileno()
+        while True:
+            chunk = os.read(fd, 65536)
+            if len(chunk) <= 0:
+                break
+            yield from self.feed(chunk)
+        yield from self.close()
+
+    def read_bytes(self, data):
+        yield from self.feed(data)
+        yield from self.close()
+
+    def feed(self, data):
+        if len(data) > 0:
+            self._has_data = True
+            self.bytes_read += len(data)
+            self._parser.feed(data)
+            yield from self.__read_events()
+
+    def close(self):
+        if self._has_data:
+            self._parser.close()
+            yield from self.__read_events()
+
+    def __read_events(self):
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._parents.append(element)
+                continue
+            self._parents.pop()
+            if len(self._parents) > 0 and self._parents[-1].tag.split("}")[-1] == 'file':
+                yield element
+                self._parents[-1].remove(element)
+
+
+# The common run of phpmd and phpcs: both report in XML, can be kept running as
+# tool servers and check several rulesets at once. A subclass names the tool,
+# its colour and priority and provides the command line, the ruleset tokenizer
+# and the reading of the findings.
+class ToolAdapter:
+    tool = None
+    color = None
+    priority = 0
+    reads_stdin = False
 
     def __init__(self, plugin, data_dir):
         self._data_dir = data_dir
         self._plugin = plugin
+        self._attribution = RulesetAttribution(self._get_rule_tokens)
+        self._servers = None
+        self._limits = ToolLimits()
+
+    def set_limits(self, limits):
+        self._limits = limits
+        if self._servers != None:
+            self._servers.set_limits(limits)
 
-    def get_hints_by_file(self, filepath, filepathReal):
+    def set_server_mode(self, use_servers, idle_timeout, memory_limit):
+        self.shutdown()
+        if use_servers:
+            self._servers = ToolServerPool(self.tool, idle_timeout, memory_limit, self._limits)
+
+    def shutdown(self):
+        if self._servers != None:
+            self._servers.shutdown()
+            self._servers = None
+
+    def get_rulesets_for_file(self, filepathReal):
+        return []
+
+    def get_hints_by_file(self, source, filepathReal, run=None):
         hints = []
 
+        if run == None:
+            run = AdapterRun(self.tool, None, filepathReal)
+
         if filepathReal[-4:]!='.php':
             return hints
 
-        color = "#8F7811"
-
-        for directory, rulesetFilepath in self._plugin.get_all_phpmd_rulesets():
-            if filepathReal[0:len(directory)] == directory and os.path.exists(rulesetFilepath):
-                try:
-                    sp = subprocess.Popen(['phpmd', filepath, 'xml', rulesetFilepath],
-                        stdin=PIPE, stdout=PIPE, stderr=PIPE
-                    )
-                    sp.wait()
-                    output, err = sp.communicate()
-                    output = output.decode()
-                    rootXml = ET.fromstring(output)
-                    for fileXml in rootXml:
-                        for violationXml in fileXml:
-                            lineBegin   = int(violationXml.attrib['beginline'])-1
-                            lineEnd     = int(violationXml.attrib['beginline'])-1 #violationXml.attrib['endline']
-                            columnBegin = 0
-                            columnEnd   = 999
-                            message     = violationXml.text.strip()
-                            hints.append([lineBegin, lineEnd, columnBegin, columnEnd, message, color, 200])
-                except OSError as error:
-                    print(error)
-        return hints
-
+        rulesets = self.get_rulesets_for_file(filepathReal)
+        if len(rulesets) <= 0:
+            return hints
 
-class PHPCSAdapter:
+        try:
+            output = None
 
-    def __init__(self, plugin, data_dir):
-        self._data_dir = data_dir
-        self._plugin = plugin
+            if self._servers != None:
+                output = self._servers.request(",".join(rulesets), filepathReal, source.data)
 
-    def get_hints_by_file(self, filepath, filepathReal):
-        hints = []
+            if output != None:
+                run.add_output(len(output))
+                run.failed = len(output) <= 0
+                hints = list(self._read_hints(XMLReportReader().read_bytes(output), rulesets))
 
-        color = "#A5A5A5"
+            else:
+                hints = self.__run_tool(source, filepathReal, rulesets, run)
 
-        if filepathReal[-4:]!='.php':
-            return hints
+            if source.cancellable.is_cancelled():
+                return []
+        except TimeoutError as error:
+            # the tool server did not answer in time and got killed
+            print(error)
+            run.timed_out = True
+        except (OSError, ET.ParseError) as error:
+            # a killed tool leaves a truncated report behind
+            run.failed = True
+            if not source.cancellable.is_cancelled() and not run.timed_out:
+                print(error)
+
+        if run.timed_out and not source.cancellable.is_cancelled():
+            return [self._limits.create_timeout_hint(self.tool, self.color, self.priority, ",".join(rulesets))]
+        return hints
 
-        for directory, rulesetFilepath in self._plugin.get_all_phpcs_rulesets():
-            if filepathReal[0:len(directory)] == directory:
+    def __run_tool(self, source, filepathReal, rulesets, run):
+        stdin = subprocess.DEVNULL
+        if self.reads_stdin:
+            stdin = PIPE
+        sp = run.popen(self._get_command(source, filepathReal, ",".join(rulesets)),
+            stdin=stdin, stdout=PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        source.cancellable.register_process(sp)
+        watch = self._limits.watch(sp, run)
+        reader = XMLReportReader()
+        try:
+            if self.reads_stdin:
+                # the tool reads all of stdin before it reports anything
                 try:
-                    sp = subprocess.Popen(['phpcs', '--report=xml', '--standard='+rulesetFilepath, filepath],  # TODO
-                        stdin=PIPE, stdout=PIPE, stderr=PIPE
-                    )
-                    sp.wait()
-                    output, err = sp.communicate()
-                    output = output.decode()
-                    if len(output)>0:
-                        rootXml = ET.fromstring(output)
-                        for fileXml in rootXml:
-                            for errorXml in fileXml:
-                                lineBegin   = int(errorXml.attrib['line'])-1
-                                lineEnd     = int(errorXml.attrib['line'])-1
-                                columnBegin = int(errorXml.attrib['column'])-1
-                                columnEnd   = int(errorXml.attrib['column'])
-                                message     = errorXml.text.strip()
-
-                                if columnBegin < 1:
-                                    columnBegin = 1
-
-                                hints.append([lineBegin, lineEnd, columnBegin, columnEnd, message, color, 100])
-                except OSError as error:
+                    sp.stdin.write(source.data)
+                    sp.stdin.close()
+                except BrokenPipeError as error:
                     print(error)
+            hints = list(self._read_hints(reader.read_stream(sp.stdout), rulesets))
+        finally:
+            watch.stop()
+            sp.stdout.close()
+            run.wait(sp)
+            source.cancellable.unregister_process(sp)
+            run.add_output(reader.bytes_read)
+        # even a clean file gets a report; no output at all means the tool failed
+        run.failed = reader.bytes_read <= 0
         return hints
+
+    def _get_command(self, source, filepathReal, rulesets):
+        raise NotImplementedError()
+
+    def _get_rule_tokens(self, ruleAttributes):
+        raise NotImplementedError()
+
+    def _read_hints(self, elements, rulesets):
+        raise NotImplementedError()
+
+
+class PHPMDAdapter(ToolAdapter):
+    tool = 'phpmd'
+    color = "#8F7811"
+    priority = 200
+
+    def get_rulesets_for_file(self, filepathReal):
+        rulesets = []
+        for rulesetFilepath in self._plugin.get_phpmd_rulesets_for_file(filepathReal):
+            if os.path.exists(rulesetFilepath):
+                rulesets.append(rulesetFilepath)
+        return rulesets
+
+    def _get_command(self, source, filepathReal, rulesets):
+        # phpmd cannot read from stdin; it accepts a comma separated list of rulesets
+        return ['phpmd', source.get_temp_path(), 'xml', rulesets]
+
+    def _get_rule_tokens(self, ruleAttributes):
+        # <rule ref="rulesets/codesize.xml"/>, <rule ref="rulesets/codesize.xml/CyclomaticComplexity"/> or <rule name="...">
+        tokens = []
+        if 'name' in ruleAttributes:
+            tokens.append(ruleAttributes['name'])
+        for part in ruleAttributes.get('ref', '').split("/"):
+            if part[-4:] == '.xml':
+                tokens.append(part[:-4])
+            elif part != '' and part != 'rulesets':
+                tokens.append(part)
+        return tokens
+
+    def _read_hints(self, violations, rulesets):
+        resolved = self._attribution.resolve(rulesets)
+        for violationXml in violations:
+            lineBegin   = int(violationXml.attrib['beginline'])-1
+            lineEnd     = int(violationXml.attrib['beginline'])-1 #violationXml.attrib['endline']
+            columnBegin = 0
+            columnEnd   = 999
+            message     = violationXml.text.strip()
+            ruleset     = self._attribution.attribute(resolved, [
+                violationXml.attrib.get('rule'),
+                # "Code Size Rules" => "codesize", as in rulesets/codesize.xml
+                violationXml.attrib.get('ruleset', '').lower().replace(" rules", "").replace(" ", ""),
+            ])
+            yield Hint(lineBegin, lineEnd, columnBegin, columnEnd, message, self.color, self.priority, ruleset)
+
+
+class PHPCSAdapter(ToolAdapter):
+    tool = 'phpcs'
+    color = "#A5A5A5"
+    priority = 100
+    reads_stdin = True
+
+    def get_rulesets_for_file(self, filepathReal):
+        return self._plugin.get_phpcs_rulesets_for_file(filepathReal)
+
+    def get_fixed_content(self, filepathReal, data, cancellable):
+        # => the content as phpcbf fixes it, or None if it could not fix anything
+        rulesets = self.get_rulesets_for_file(filepathReal)
+        if filepathReal[-4:]!='.php' or len(rulesets) <= 0:
+            return None
+
+        run = AdapterRun('phpcbf', ",".join(rulesets), filepathReal)
+        try:
+            sp = run.popen(['phpcbf', '-q', '--standard='+",".join(rulesets), '--stdin-path='+filepathReal, '-'],
+                stdin=PIPE, stdout=PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+            )
+        except OSError as error:
+            print(error)
+            return None
+
+        cancellable.register_process(sp)
+        watch = self._limits.watch(sp, run)
+        try:
+            # the fixed file is as big as the input, so write and read at the same time
+            output = sp.communicate(data)[0]
+        finally:
+            watch.stop()
+            cancellable.unregister_process(sp)
+
+        if run.timed_out:
+            print("phpcbf timed out after %s seconds" % self._limits.timeout)
+            return None
+
+        # 1: everything got fixed, 2: some findings could not be fixed
+        if cancellable.is_cancelled() or sp.returncode not in [1, 2] or len(output) <= 0:
+            return None
+
+        return output
+
+    def _get_command(self, source, filepathReal, rulesets):
+        # phpcs accepts a comma separated list of standards
+        return ['phpcs', '--report=xml', '--standard='+rulesets, '--stdin-path='+filepathReal, '-']
+
+    def _get_rule_tokens(self, ruleAttributes):
+        # <rule ref="PSR2"/>, <rule ref="Generic.Files.LineLength"/> or <rule ref="/path/to/MyStandard/ruleset.xml"/>
+        ref = ruleAttributes.get('ref', '')
+        if "/" in ref:
+            parts = ref.rstrip("/").split("/")
+            if parts[-1][-4:] == '.xml' and len(parts) > 1:
+                return [parts[-2]]
+            return [parts[-1]]
+        return [ref.split(".")[0]]
+
+    def _read_hints(self, errors, rulesets):
+        resolved = self._attribution.resolve(rulesets)
+        for errorXml in errors:
+            lineBegin   = int(errorXml.attrib['line'])-1
+            lineEnd     = int(errorXml.attrib['line'])-1
+            columnBegin = int(errorXml.attrib['column'])-1
+            columnEnd   = int(errorXml.attrib['column'])
+            message     = errorXml.text.strip()
+            ruleset     = self._attribution.attribute(resolved, [
+                errorXml.attrib.get('source', '').split(".")[0]
+            ])
+
+            if columnBegin < 1:
+                columnBegin = 1
+
+            yield Hint(lineBegin, lineEnd, columnBegin, columnEnd, message, self.color, self.priority, ruleset)
@@ -0,0 +1,89 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from gi.repository import GLib
+
+# Runs hint jobs in a bounded pool of worker threads.
+# Each key (a view) has at most one job in flight; jobs scheduled meanwhile are
+# coalesced into a single re-run with the most recent job.
+# Once shut down, jobs still pending or scheduled later are dropped.
+# The 'done' callback of a job is always called from the GTK main loop.
+class HintScheduler:
+
+    def __init__(self, max_jobs=2):
+        self._max_jobs = max_jobs
+        self._executor = None
+        self._lock     = Lock()
+        self._running  = {} # key => [work, done] of the job to run next, or None
+        self._shut_down = False
+
+    def schedule(self, key, work, done):
+        with self._lock:
+            if self._shut_down:
+                return
+            if key in self._running:
+                self._running[key] = [work, done]
+                return
+            self._running[key] = None
+            self.__get_executor().submit(self.__run, key, work, done)
+
+    def forget(self, key):
+        with self._lock:
+            if key in self._running:
+                self._running[key] = None
+
+    def shutdown(self):
+        with self._lock:
+            self._shut_down = True
+            self._running = {}
+            if self._executor != None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def __get_executor(self):
+        # only called with the lock held, so no pool gets created after shutdown()
+        if self._executor == None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_jobs,
+                thread_name_prefix="addiks-hints-job"
+            )
+        return self._executor
+
+    def __run(self, key, work, done):
+        try:
+            result = work()
+        except Exception as exception:
+            print(exception)
+            result = None
+
+        with self._lock:
+            if self._shut_down:
+                return
+            GLib.idle_add(self.__done, done, result)
+            nextJob = self._running[key]
+            if nextJob == None:
+                del self._running[key]
+                return
+            self._running[key] = None
+            # re-queue instead of looping, so other views get their turn
+            self.__get_executor().submit(self.__run, key, nextJob[0], nextJob[1])
+
+    def __done(self, done, result):
+        done(result)
+        return False
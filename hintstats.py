@@ -0,0 +1,193 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import subprocess
+from threading import Lock
+from collections import deque
+
+# What one adapter did for one file. Filled in by HintManager (timing, cache)
+# and by the adapter itself (processes it started, output it read).
+class AdapterRun:
+
+    def __init__(self, adapterName, ruleset, filePath, cacheHit=False):
+        self.adapter      = adapterName
+        self.ruleset      = ruleset
+        self.file         = filePath
+        self.cache_hit    = cacheHit
+        self.started_at   = time.time()
+        self.wall_time    = 0.0
+        self.spawn_time   = None
+        self.cpu_user     = None
+        self.cpu_system   = None
+        self.output_bytes = 0
+        self.hint_count   = 0
+        self.cancelled    = False
+        self.timed_out    = False
+        self.failed       = False # the tool did not deliver a usable report
+        self._begin       = time.monotonic()
+
+    def start(self):
+        # the run only starts once the adapter does, not while it waits for others
+        self.started_at = time.time()
+        self._begin     = time.monotonic()
+
+    def popen(self, command, **kwargs):
+        begin = time.monotonic()
+        process = subprocess.Popen(command, **kwargs)
+        self.spawn_time = (self.spawn_time or 0.0) + time.monotonic() - begin
+        return process
+
+    def wait(self, process):
+        # reaps the process itself to get at its resource usage
+        try:
+            pid, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # already reaped by someone polling it (e.g. Cancellable)
+            return process.wait()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        self.cpu_user   = (self.cpu_user or 0.0) + usage.ru_utime
+        self.cpu_system = (self.cpu_system or 0.0) + usage.ru_stime
+        return process.returncode
+
+    def add_output(self, size):
+        self.output_bytes += size
+
+    def finish(self, hints, cancelled=False):
+        self.wall_time  = time.monotonic() - self._begin
+        self.hint_count = len(hints or ())
+        self.cancelled  = cancelled
+
+    def to_dict(self):
+        return {
+            'time':         self.started_at,
+            'adapter':      self.adapter,
+            'ruleset':      self.ruleset,
+            'file':         self.file,
+            'cache':        "hit" if self.cache_hit else "miss",
+            'wall_time':    self.wall_time,
+            'spawn_time':   self.spawn_time,
+            'cpu_user':     self.cpu_user,
+            'cpu_system':   self.cpu_system,
+            'output_bytes': self.output_bytes,
+            'hints':        self.hint_count,
+            'cancelled':    self.cancelled,
+            'timed_out':    self.timed_out,
+            'failed':       self.failed,
+        }
+
+
+# The recent adapter runs, per adapter and ruleset, and an optional log of all
+# runs (one JSON object per line) in <data_dir>/stats/runs.jsonl.
+class HintStats:
+
+    def __init__(self, data_dir, history=256):
+        self._data_dir    = data_dir
+        self._history     = history
+        self._runs        = {} # (adapter, ruleset) => deque of run dicts
+        self._log_enabled = False
+        self._log_handle  = None
+        self._lock        = Lock()
+
+    def set_log_enabled(self, enabled):
+        with self._lock:
+            self._log_enabled = enabled
+            if not enabled:
+                self.__close_log()
+
+    def record(self, run):
+        entry = run.to_dict()
+        with self._lock:
+            key = (entry['adapter'], entry['ruleset'])
+            if key not in self._runs:
+                self._runs[key] = deque(maxlen=self._history)
+            self._runs[key].append(entry)
+            if self._log_enabled:
+                self.__write_log(entry)
+
+    def get_runs(self, adapterName=None):
+        runs = []
+        with self._lock:
+            for adapter, ruleset in self._runs:
+                if adapterName == None or adapter == adapterName:
+                    runs += self._runs[(adapter, ruleset)]
+        return sorted(runs, key=lambda entry: entry['time'])
+
+    def get_summary(self):
+        summary = []
+        with self._lock:
+            keys = sorted(self._runs, key=lambda key: (key[0], key[1] or ""))
+            for adapter, ruleset in keys:
+                runs = list(self._runs[(adapter, ruleset)])
+                misses = [entry for entry in runs if entry['cache'] == "miss" and not entry['cancelled']]
+                wallTimes  = sorted(entry['wall_time'] for entry in misses)
+                spawnTimes = sorted(entry['spawn_time'] for entry in misses if entry['spawn_time'] != None)
+                cpuTimes   = [entry['cpu_user'] + entry['cpu_system'] for entry in misses if entry['cpu_user'] != None]
+                summary.append({
+                    'adapter':      adapter,
+                    'ruleset':      ruleset,
+                    'runs':         len(runs),
+                    'cache_hits':   len(runs) - len([entry for entry in runs if entry['cache'] == "miss"]),
+                    'timeouts':     len([entry for entry in runs if entry.get('timed_out')]),
+                    'wall_p50':     self.__percentile(wallTimes, 50),
+                    'wall_p95':     self.__percentile(wallTimes, 95),
+                    'spawn_p50':    self.__percentile(spawnTimes, 50),
+                    'cpu_mean':     sum(cpuTimes) / len(cpuTimes) if len(cpuTimes) > 0 else None,
+                    'output_bytes': sum(entry['output_bytes'] for entry in misses),
+                    'hints':        sum(entry['hints'] for entry in runs),
+                })
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._runs = {}
+
+    def close(self):
+        with self._lock:
+            self.__close_log()
+
+    def get_log_file(self):
+        return os.path.join(self._data_dir, "stats", "runs.jsonl")
+
+    def __percentile(self, sortedValues, percent):
+        # nearest rank
+        if len(sortedValues) <= 0:
+            return None
+        rank = max(1, -(-len(sortedValues) * percent // 100))
+        return sortedValues[int(rank) - 1]
+
+    def __write_log(self, entry):
+        try:
+            if self._log_handle == None:
+                path = self.get_log_file()
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                self._log_handle = open(path, "a", buffering=1)
+            self._log_handle.write(json.dumps(entry) + "\n")
+        except OSError as error:
+            print(error)
+            self._log_enabled = False
+            self.__close_log()
+
+    def __close_log(self):
+        if self._log_handle != None:
+            try:
+                self._log_handle.close()
+            except OSError as error:
+                print(error)
+            self._log_handle = None
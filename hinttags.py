@@ -0,0 +1,174 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_right
+
+# More edits than this between two updates are not worth tracking; the next
+# update then simply clears and re-tags everything.
+MAX_EDITS = 256
+
+# Keeps track of which hint ranges are currently tagged in a buffer, so a new
+# set of hints only needs to touch the ranges that actually changed.
+# A range is a tuple (lineBegin, lineEnd, columnBegin, columnEnd, color).
+# Edits to the buffer are folded into one map from old to new line numbers as
+# they come in; ranges on edited lines are no longer known exactly and their
+# lines get cleared on the next update. Typing within a line that is already
+# edited changes nothing in that map, so it costs nothing.
+class HintTagState:
+
+    def __init__(self):
+        self._ranges    = set()
+        self._clear_all = True
+        self.__reset_edits()
+
+    def invalidate(self):
+        self._clear_all = True
+        self.__reset_edits()
+
+    def record_insert(self, line, newlines):
+        self.__record_edit(line, newlines)
+
+    def record_delete(self, line, lines):
+        self.__record_edit(line, -lines)
+
+    # Returns (clearAll, clearSpans, removeRanges, addRanges) to get the buffer from its
+    # current state to newRanges; clearSpans are (lineBegin, lineEnd) tuples.
+    def update(self, newRanges):
+        newRanges = set(newRanges)
+
+        if self._clear_all:
+            self._clear_all = False
+            self.__reset_edits()
+            self._ranges    = newRanges
+            return (True, [], [], list(newRanges))
+
+        ranges, dirtyLines = self.__apply_edits()
+
+        removeRanges = []
+        clearedLines = set(dirtyLines)
+        for hintRange in ranges - newRanges:
+            removeRanges.append(hintRange)
+            clearedLines.update(range(hintRange[0], hintRange[1]+1))
+
+        addRanges = []
+        for hintRange in newRanges:
+            if hintRange not in ranges or self.__touches(hintRange, clearedLines):
+                addRanges.append(hintRange)
+
+        self._ranges = newRanges
+        return (False, self.__to_spans(dirtyLines), removeRanges, addRanges)
+
+    def __reset_edits(self):
+        # [oldBegin, newBegin, isDirty] sorted by oldBegin; a segment reaches up to the
+        # next one. Old lines of a clean segment keep their distance to each other,
+        # those of a dirty (edited) segment all end up on newBegin.
+        self._segments    = [[0, 0, False]]
+        self._dirty_lines = set()
+        self._edit_count  = 0
+
+    def __record_edit(self, line, delta):
+        if self._clear_all:
+            return
+        if delta == 0 and line in self._dirty_lines:
+            return # e.g. typing: the line is known to be edited already
+        self._edit_count += 1
+        if self._edit_count > MAX_EDITS:
+            self.invalidate()
+            return
+
+        # new lines [line, affectedEnd] are the ones whose content changes
+        affectedEnd = line
+        if delta < 0:
+            affectedEnd = line - delta
+
+        def shift(newLine):
+            if newLine < line:
+                return newLine
+            if newLine > affectedEnd:
+                return newLine + delta
+            return line
+
+        segments = []
+        for index in range(len(self._segments)):
+            oldBegin, newBegin, isDirty = self._segments[index]
+            if not isDirty:
+                # split clean segments where the edited lines begin and end
+                newEnd = None
+                if index + 1 < len(self._segments):
+                    newEnd = newBegin + self._segments[index+1][0] - oldBegin - 1
+                for splitLine in [line, affectedEnd+1]:
+                    if newBegin < splitLine and (newEnd == None or splitLine <= newEnd):
+                        segments.append([oldBegin, shift(newBegin), line <= newBegin <= affectedEnd])
+                        oldBegin += splitLine - newBegin
+                        newBegin  = splitLine
+                isDirty = line <= newBegin <= affectedEnd
+            segment = [oldBegin, shift(newBegin), isDirty]
+            if len(segments) > 0 and isDirty and segments[-1][2] and segments[-1][1] == segment[1]:
+                continue # merges into the dirty segment before it
+            segments.append(segment)
+        self._segments = segments
+
+        dirtyLines = set()
+        for dirtyLine in self._dirty_lines:
+            dirtyLines.add(shift(dirtyLine))
+        dirtyLines.update(range(line, line + max(delta, 0) + 1))
+        self._dirty_lines = dirtyLines
+
+    def __apply_edits(self):
+        segments   = self._segments
+        dirtyLines = self._dirty_lines
+        ranges     = self._ranges
+
+        if len(segments) > 1 or segments[0][1] != 0 or segments[0][2]:
+            oldBegins  = []
+            dirtyCount = [0] # dirty segments before index
+            for oldBegin, newBegin, isDirty in segments:
+                oldBegins.append(oldBegin)
+                dirtyCount.append(dirtyCount[-1] + (1 if isDirty else 0))
+
+            def locate(oldLine):
+                index = bisect_right(oldBegins, oldLine) - 1
+                oldBegin, newBegin, isDirty = segments[index]
+                if isDirty:
+                    return (index, newBegin)
+                return (index, newBegin + oldLine - oldBegin)
+
+            ranges = set()
+            for lineBegin, lineEnd, columnBegin, columnEnd, color in self._ranges:
+                indexBegin, newLineBegin = locate(lineBegin)
+                indexEnd,   newLineEnd   = locate(lineEnd)
+                if dirtyCount[indexEnd+1] - dirtyCount[indexBegin] > 0:
+                    dirtyLines.update(range(newLineBegin, newLineEnd + 1))
+                else:
+                    ranges.add((newLineBegin, newLineEnd, columnBegin, columnEnd, color))
+
+        self.__reset_edits()
+        return (ranges, dirtyLines)
+
+    def __touches(self, hintRange, lines):
+        for line in range(hintRange[0], hintRange[1]+1):
+            if line in lines:
+                return True
+        return False
+
+    def __to_spans(self, lines):
+        spans = []
+        for line in sorted(lines):
+            if len(spans) > 0 and spans[-1][1] == line - 1:
+                spans[-1] = (spans[-1][0], line)
+            else:
+                spans.append((line, line))
+        return spans
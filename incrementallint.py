@@ -0,0 +1,161 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+from collections import OrderedDict
+
+# Syntax checks that only re-parse the top-level declarations an edit touched.
+#
+# The checker reports, besides its findings, the line ranges of all top-level
+# statements (see php-parse-worker.php). When a file is checked again, the lines
+# the edit replaced are found by stripping the common prefix and suffix of the
+# old and new content. If these lie within a run of class / function declarations
+# that share no line with other statements, only that run is parsed again; the
+# findings and statements before it are kept, those after it get shifted by the
+# number of inserted or removed lines. Everything else causes a full parse.
+class IncrementalLint:
+
+    def __init__(self, maxFiles=32):
+        self._max_files = maxFiles
+        self._states    = OrderedDict() # filePath => [lines, hints, statements]
+        self._lock      = Lock()
+
+    def forget(self, filePath):
+        with self._lock:
+            self._states.pop(filePath, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    # check(content) => [hints, statements] or None, statements being a list
+    # of [isDeclaration, lineBegin, lineEnd] (0-based, inclusive) or None.
+    def lint(self, filePath, content, check):
+        lines = content.split(b"\n")
+        with self._lock:
+            state = self._states.pop(filePath, None)
+
+        result = None
+        if state != None:
+            result = self.__lint_slice(state, lines, check)
+
+        if result == None:
+            result = check(content)
+            if result == None:
+                return None
+
+        hints, statements = result
+        if statements != None:
+            with self._lock:
+                self._states[filePath] = [lines, hints, statements]
+                while len(self._states) > self._max_files:
+                    self._states.popitem(last=False)
+
+        return list(hints)
+
+    def __lint_slice(self, state, lines, check):
+        oldLines, oldHints, statements = state
+
+        prefix = 0
+        maxCommon = min(len(oldLines), len(lines))
+        while prefix < maxCommon and oldLines[prefix] == lines[prefix]:
+            prefix += 1
+        if prefix == len(oldLines) and prefix == len(lines):
+            return [oldHints, statements]
+
+        suffix = 0
+        while suffix < maxCommon - prefix and oldLines[-1-suffix] == lines[-1-suffix]:
+            suffix += 1
+
+        changedEnd = len(oldLines) - suffix # exclusive, in old lines
+        delta = len(lines) - len(oldLines)
+
+        span = self.__find_declarations(statements, prefix, changedEnd)
+        if span == None:
+            return None
+        first, last = span
+        lineBegin = statements[first][1]
+        lineEnd   = statements[last][2]
+
+        if lineEnd + delta < lineBegin or b"<?" in lines[lineBegin]:
+            return None
+
+        # the slice keeps its columns; only its lines have to be moved back
+        sliceOffset = lineBegin - 1
+        result = check(b"<?php\n" + b"\n".join(lines[lineBegin:lineEnd+delta+1]))
+        if result == None:
+            return None
+        sliceHints, sliceStatements = result
+        if sliceStatements == None or len(sliceHints) > 0:
+            # broken code may reach beyond the declaration; let the full parse decide
+            return None
+        for isDeclaration, statementBegin, statementEnd in sliceStatements:
+            if not isDeclaration:
+                return None
+
+        hints = []
+        for hint in oldHints:
+            if hint.line_end < lineBegin:
+                hints.append(hint)
+            elif hint.line_begin > lineEnd:
+                hints.append(hint.shifted(delta))
+
+        newStatements = statements[0:first]
+        for isDeclaration, statementBegin, statementEnd in sliceStatements:
+            newStatements.append([isDeclaration, statementBegin + sliceOffset, statementEnd + sliceOffset])
+        for isDeclaration, statementBegin, statementEnd in statements[last+1:]:
+            newStatements.append([isDeclaration, statementBegin + delta, statementEnd + delta])
+
+        return [hints, newStatements]
+
+    def __find_declarations(self, statements, changedBegin, changedEnd):
+        # the run of statements covering the changed lines [changedBegin, changedEnd),
+        # an empty range being an insertion in front of line changedBegin
+        first = None
+        last = None
+        for index in range(len(statements)):
+            isDeclaration, lineBegin, lineEnd = statements[index]
+            if changedEnd > changedBegin:
+                if lineBegin <= changedBegin:
+                    first = index
+                if last == None and lineEnd >= changedEnd - 1:
+                    last = index
+            else:
+                if lineBegin < changedBegin:
+                    first = index
+                if last == None and lineEnd >= changedBegin:
+                    last = index
+
+        if first == None or last == None or first > last:
+            return None
+
+        lineBegin = statements[first][1]
+        lineEnd   = statements[last][2]
+        if changedEnd > changedBegin:
+            if not (lineBegin <= changedBegin and changedEnd - 1 <= lineEnd):
+                return None
+        elif not (lineBegin < changedBegin <= lineEnd):
+            return None
+
+        for index in range(first, last+1):
+            if not statements[index][0]:
+                return None
+        if first > 0 and statements[first-1][2] >= lineBegin:
+            return None
+        if last+1 < len(statements) and statements[last+1][1] <= lineEnd:
+            return None
+
+        return [first, last]
@@ -0,0 +1,98 @@
+<?php
+/**
+ * Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * Long-lived syntax-check worker for the hints plugin.
+ *
+ * Reads frames of the form "<length>\n<php-code>" from STDIN and answers each
+ * one with "<length>\n<report>" on STDOUT. The report uses the same format as
+ * "php-parse.php -c --no-dump": one "<message> from <line>:<col> to <line>:<col>"
+ * per syntax error, followed by one "statement <declaration|other> <line> <line>"
+ * per top-level statement (statements of namespaces count as top-level).
+ */
+
+foreach ([
+    __DIR__ . '/PHP-Parser/vendor/autoload.php',
+    __DIR__ . '/PHP-Parser/lib/bootstrap.php',
+] as $autoloadFile) {
+    if (file_exists($autoloadFile)) {
+        require $autoloadFile;
+        break;
+    }
+}
+
+ini_set('xdebug.max_nesting_level', 3000);
+
+function addiks_report_statements(array $statements)
+{
+    $report = '';
+    foreach ($statements as $statement) {
+        if ($statement instanceof PhpParser\Node\Stmt\Namespace_ && is_array($statement->stmts)) {
+            $report .= addiks_report_statements($statement->stmts);
+            continue;
+        }
+
+        // doc-comments belong to their declaration
+        $startLine = $statement->getStartLine();
+        foreach ($statement->getComments() as $comment) {
+            if (method_exists($comment, 'getStartLine')) {
+                $startLine = min($startLine, $comment->getStartLine());
+            } else {
+                $startLine = min($startLine, $comment->getLine());
+            }
+            break;
+        }
+
+        $kind = 'other';
+        if ($statement instanceof PhpParser\Node\Stmt\ClassLike
+         || $statement instanceof PhpParser\Node\Stmt\Function_) {
+            $kind = 'declaration';
+        }
+
+        $report .= sprintf("statement %s %d %d\n", $kind, $startLine, $statement->getEndLine());
+    }
+    return $report;
+}
+
+$lexer = new PhpParser\Lexer\Emulative(['usedAttributes' => [
+    'startLine', 'endLine', 'startFilePos', 'endFilePos', 'comments'
+]]);
+$parser = (new PhpParser\ParserFactory)->create(PhpParser\ParserFactory::PREFER_PHP7, $lexer);
+
+while (($header = fgets(STDIN)) !== false) {
+    $length = (int)trim($header);
+    $code = '';
+    if ($length > 0) {
+        $code = stream_get_contents(STDIN, $length);
+    }
+
+    $report = '';
+    $statements = null;
+    $errorHandler = new PhpParser\ErrorHandler\Collecting;
+    try {
+        $statements = $parser->parse($code, $errorHandler);
+        $errors = $errorHandler->getErrors();
+    } catch (PhpParser\Error $error) {
+        $errors = [$error];
+    }
+
+    foreach ($errors as $error) {
+        if ($error->hasColumnInfo()) {
+            $report .= $error->getMessageWithColumnInfo($code) . "\n";
+        } else {
+            $report .= $error->getMessage() . "\n";
+        }
+    }
+
+    if (is_array($statements)) {
+        $report .= addiks_report_statements($statements);
+    }
+
+    fwrite(STDOUT, strlen($report) . "\n" . $report);
+    fflush(STDOUT);
+}
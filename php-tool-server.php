@@ -0,0 +1,175 @@
+<?php
+/**
+ * Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * Resident phpcs / phpmd server for the hints plugin.
+ *
+ * usage: php php-tool-server.php <phpcs|phpmd> <socket> <ruleset> <tool-binary> <idle-seconds> <memory-limit-mb>
+ *
+ * Loads the tool (autoloader, ruleset) once and then serves requests on a unix
+ * socket, one per connection: the client sends two frames "<length>\n<bytes>"
+ * (the path of the checked file and its content) and gets one frame back with
+ * the XML report. The server exits after <idle-seconds> without a request or
+ * once it uses more than <memory-limit-mb> megabytes.
+ */
+
+list(, $tool, $socketPath, $ruleset, $toolBinary, $idleTimeout, $memoryLimit) = $argv;
+
+function addiks_find_autoloader($toolBinary)
+{
+    $directory = dirname(realpath($toolBinary));
+    for ($level = 0; $level < 6; $level++) {
+        foreach (['/autoload.php', '/vendor/autoload.php'] as $candidate) {
+            if (file_exists($directory . $candidate)) {
+                return $directory . $candidate;
+            }
+        }
+        $directory = dirname($directory);
+    }
+    return null;
+}
+
+function addiks_read_frame($stream)
+{
+    $header = fgets($stream);
+    if ($header === false) {
+        return null;
+    }
+    $length = (int)trim($header);
+    if ($length <= 0) {
+        return '';
+    }
+    $data = stream_get_contents($stream, $length);
+    if ($data === false || strlen($data) < $length) {
+        return null;
+    }
+    return $data;
+}
+
+$autoloader = addiks_find_autoloader($toolBinary);
+if ($autoloader === null) {
+    fwrite(STDERR, "No autoloader found for {$toolBinary}\n");
+    exit(1);
+}
+require $autoloader;
+
+if ($tool === 'phpcs') {
+    if (!defined('PHP_CODESNIFFER_CBF')) {
+        define('PHP_CODESNIFFER_CBF', false);
+    }
+    if (!defined('PHP_CODESNIFFER_VERBOSITY')) {
+        define('PHP_CODESNIFFER_VERBOSITY', 0);
+    }
+
+    $config = new PHP_CodeSniffer\Config(['--standard=' . $ruleset, '-q']);
+    $rulesetObject = new PHP_CodeSniffer\Ruleset($config);
+
+    $check = function ($path, $content) use ($config, $rulesetObject) {
+        $file = new PHP_CodeSniffer\Files\DummyFile($content, $rulesetObject, $config);
+        $file->path = $path;
+        $file->process();
+
+        $xml = '<?xml version="1.0" encoding="UTF-8"?>' . "\n";
+        $xml .= '<phpcs version="' . PHP_CodeSniffer\Config::VERSION . '">';
+        $xml .= '<file name="' . htmlspecialchars($path) . '">';
+        foreach (['error' => $file->getErrors(), 'warning' => $file->getWarnings()] as $type => $lines) {
+            foreach ($lines as $line => $columns) {
+                foreach ($columns as $column => $messages) {
+                    foreach ($messages as $message) {
+                        $xml .= sprintf(
+                            '<%s line="%d" column="%d" source="%s" severity="%d" fixable="%d">%s</%s>',
+                            $type,
+                            $line,
+                            $column,
+                            htmlspecialchars($message['source']),
+                            $message['severity'],
+                            (int)$message['fixable'],
+                            htmlspecialchars($message['message']),
+                            $type
+                        );
+                    }
+                }
+            }
+        }
+        $xml .= '</file></phpcs>';
+
+        $file->cleanUp();
+        return $xml;
+    };
+
+} elseif ($tool === 'phpmd') {
+    $ruleSetFactory = new PHPMD\RuleSetFactory();
+    $ruleSetFactory->createRuleSets($ruleset);
+
+    $check = function ($path, $content) use ($ruleset, $ruleSetFactory) {
+        // phpmd can only check files
+        $tempBase = tempnam(sys_get_temp_dir(), 'addiks-hints');
+        $tempPath = $tempBase . '.php';
+        file_put_contents($tempPath, $content);
+
+        $stream = fopen('php://memory', 'w+');
+        $renderer = new PHPMD\Renderer\XMLRenderer();
+        $renderer->setWriter(new PHPMD\Writer\StreamWriter($stream));
+
+        $phpmd = new PHPMD\PHPMD();
+        $phpmd->processFiles($tempPath, $ruleset, [$renderer], $ruleSetFactory);
+
+        rewind($stream);
+        $xml = stream_get_contents($stream);
+        fclose($stream);
+
+        unlink($tempPath);
+        unlink($tempBase);
+        return $xml;
+    };
+
+} else {
+    fwrite(STDERR, "Unknown tool {$tool}\n");
+    exit(1);
+}
+
+@unlink($socketPath);
+$server = stream_socket_server('unix://' . $socketPath, $errno, $errstr);
+if ($server === false) {
+    fwrite(STDERR, "{$errstr}\n");
+    exit(1);
+}
+
+while (true) {
+    $read = [$server];
+    $write = null;
+    $except = null;
+    if (stream_select($read, $write, $except, (int)$idleTimeout) < 1) {
+        break;
+    }
+
+    $client = stream_socket_accept($server, 5);
+    if ($client === false) {
+        continue;
+    }
+
+    $path = addiks_read_frame($client);
+    $content = addiks_read_frame($client);
+    if ($path !== null && $content !== null) {
+        try {
+            $report = $check($path, $content);
+        } catch (Throwable $exception) {
+            fwrite(STDERR, $exception->getMessage() . "\n");
+            $report = '';
+        }
+        fwrite($client, strlen($report) . "\n" . $report);
+    }
+    fclose($client);
+
+    if (memory_get_usage(true) > (int)$memoryLimit * 1024 * 1024) {
+        break;
+    }
+}
+
+fclose($server);
+@unlink($socketPath);
@@ -0,0 +1,109 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import select
+import subprocess
+from threading import Lock
+from subprocess import PIPE
+
+# Frames in both directions are "<length>\n<bytes>", see php-parse-worker.php
+# check() returns None if the worker failed and raises TimeoutError if it hung.
+# The ToolLimits of the adapter give the timeout of a check and the memory limit
+# of the worker process.
+class PHPLintWorker:
+
+    def __init__(self, command, limits):
+        self._command = command
+        self._limits  = None
+        self._timeout = None
+        self.set_limits(limits)
+        self._process = None
+        self._buffer  = b""
+        self._lock    = Lock()
+
+    def check(self, content):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return self.__request(content)
+                except TimeoutError:
+                    # a hanging worker gets killed, but don't wait for it twice
+                    self.__stop()
+                    raise
+                except (OSError, EOFError, ValueError) as error:
+                    print(error)
+                    self.__stop()
+            return None
+
+    def set_limits(self, limits):
+        self._limits = limits
+        self._timeout = limits.timeout
+        if limits.timeout <= 0:
+            self._timeout = None
+
+    def shutdown(self):
+        with self._lock:
+            self.__stop()
+
+    def __request(self, content):
+        if self._process == None or self._process.poll() != None:
+            self.__start()
+        self._process.stdin.write(str(len(content)).encode() + b"\n" + content)
+        self._process.stdin.flush()
+        length = int(self.__read_line())
+        return self.__read_bytes(length).decode()
+
+    def __start(self):
+        self.__stop()
+        self._process = subprocess.Popen(self._command,
+            stdin=PIPE, stdout=PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        # no cpu limit, the worker lives through many checks
+        self._limits.apply(self._process, False)
+        self._buffer  = b""
+
+    def __stop(self):
+        if self._process != None:
+            if self._process.poll() == None:
+                self._process.kill()
+            self._process.wait()
+            self._process.stdin.close()
+            self._process.stdout.close()
+            self._process = None
+        self._buffer = b""
+
+    def __read_line(self):
+        while b"\n" not in self._buffer:
+            self.__fill()
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line
+
+    def __read_bytes(self, length):
+        while len(self._buffer) < length:
+            self.__fill()
+        data, self._buffer = self._buffer[:length], self._buffer[length:]
+        return data
+
+    def __fill(self):
+        fd = self._process.stdout.fileno()
+        readable, writable, failed = select.select([fd], [], [], self._timeout)
+        if len(readable) <= 0:
+            raise TimeoutError("php lint worker did not answer within %s seconds" % self._timeout)
+        chunk = os.read(fd, 65536)
+        if len(chunk) <= 0:
+            raise EOFError("php lint worker exited")
+        self._buffer += chunk
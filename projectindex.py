@@ -0,0 +1,167 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import sqlite3
+from threading import Lock
+from hint import Hint
+
+# Bump whenever the schema or the layout of the stored hints changes.
+INDEX_FORMAT = 1
+
+# The checker results of every file ever checked, kept in a SQLite database.
+# A file is known by its path, mtime and size: as long as these did not change,
+# its content hash (and with it its hints) can be taken from the index without
+# even reading the file. Each adapter's hints are stored with the cache-key they
+# were produced for, so a changed ruleset only invalidates that adapter's rows.
+class ProjectIndex:
+
+    def __init__(self, data_dir, enabled=True):
+        self._data_dir   = data_dir
+        self._enabled    = enabled
+        self._connection = None
+        self._lock       = Lock()
+
+    def set_enabled(self, enabled):
+        with self._lock:
+            self._enabled = enabled
+            if not enabled:
+                self.__close()
+
+    @staticmethod
+    def stat_file(filePath):
+        try:
+            stat = os.stat(filePath)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get_content_hash(self, filePath, stat):
+        # the content hash recorded for this file, if it was not modified since
+        if stat == None:
+            return None
+        row = self.__query(
+            "SELECT hash FROM files WHERE path = ? AND mtime_ns = ? AND size = ?",
+            (filePath, stat[0], stat[1])
+        )
+        if row == None:
+            return None
+        return row[0]
+
+    def get(self, filePath, adapterName, cacheKey):
+        row = self.__query(
+            "SELECT hints FROM hints WHERE path = ? AND adapter = ? AND cache_key = ?",
+            (filePath, adapterName, cacheKey)
+        )
+        if row == None:
+            return None
+        return [Hint.from_list(hint) for hint in json.loads(row[0])]
+
+    def put(self, filePath, stat, contentHash, adapterName, cacheKey, hints):
+        statements = []
+        if stat != None:
+            statements.append([
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                (filePath, stat[0], stat[1], contentHash)
+            ])
+        statements.append([
+            "INSERT OR REPLACE INTO hints (path, adapter, cache_key, hints) VALUES (?, ?, ?, ?)",
+            (filePath, adapterName, cacheKey, json.dumps([hint.to_list() for hint in hints]))
+        ])
+        self.__execute(statements)
+
+    def forget(self, filePath):
+        self.__execute([
+            ["DELETE FROM files WHERE path = ?", (filePath, )],
+            ["DELETE FROM hints WHERE path = ?", (filePath, )],
+        ])
+
+    def clear(self):
+        self.__execute([
+            ["DELETE FROM files", ()],
+            ["DELETE FROM hints", ()],
+        ])
+
+    def close(self):
+        with self._lock:
+            self.__close()
+
+    def get_index_file(self):
+        return os.path.join(self._data_dir, "cache", "hints.sqlite")
+
+    def __query(self, sql, parameters):
+        with self._lock:
+            connection = self.__connect()
+            if connection == None:
+                return None
+            try:
+                return connection.execute(sql, parameters).fetchone()
+            except sqlite3.Error as error:
+                print(error)
+                return None
+
+    def __execute(self, statements):
+        with self._lock:
+            connection = self.__connect()
+            if connection == None:
+                return
+            try:
+                with connection:
+                    for sql, parameters in statements:
+                        connection.execute(sql, parameters)
+            except sqlite3.Error as error:
+                print(error)
+
+    def __connect(self):
+        if self._connection == None and self._enabled:
+            path = self.get_index_file()
+            try:
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                connection = sqlite3.connect(path, check_same_thread=False)
+                # the index can always be rebuilt, losing the last writes on a crash is fine
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("PRAGMA synchronous = NORMAL")
+                if connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_FORMAT:
+                    with connection:
+                        connection.execute("DROP TABLE IF EXISTS files")
+                        connection.execute("DROP TABLE IF EXISTS hints")
+                        connection.execute(
+                            "CREATE TABLE files ("
+                            " path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, hash TEXT"
+                            ")"
+                        )
+                        connection.execute(
+                            "CREATE TABLE hints ("
+                            " path TEXT, adapter TEXT, cache_key TEXT, hints TEXT,"
+                            " PRIMARY KEY (path, adapter)"
+                            ")"
+                        )
+                        connection.execute("PRAGMA user_version = %d" % INDEX_FORMAT)
+                self._connection = connection
+            except (OSError, sqlite3.Error) as error:
+                print(error)
+                self._enabled = False
+        return self._connection
+
+    def __close(self):
+        if self._connection != None:
+            try:
+                self._connection.close()
+            except sqlite3.Error as error:
+                print(error)
+            self._connection = None
@@ -0,0 +1,103 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from hintmanager import Cancellable
+
+# Runs the active checkers of a HintManager over every .php file below a directory.
+# Each job runs the adapters of its file one after another and only waits for
+# the external tools, so a pool of cpu-count threads keeps cpu-count tool
+# processes busy.
+# The callbacks get called from worker threads:
+#   on_result(filePath, hints), on_progress(done, total), on_finished(wasCancelled)
+class ProjectScanner:
+
+    def __init__(self, hint_manager, directory, on_result, on_progress, on_finished, max_workers=None):
+        self._hint_manager = hint_manager
+        self._directory    = directory
+        self._on_result    = on_result
+        self._on_progress  = on_progress
+        self._on_finished  = on_finished
+        self._max_workers  = max_workers or os.cpu_count() or 1
+        self._cancelled    = False
+        self._running      = []
+        self._done         = 0
+        self._total        = 0
+        self._lock         = Lock()
+
+    def start(self):
+        thread = Thread(target=self.__run, name="addiks-hints-scan", daemon=True)
+        thread.start()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            running = list(self._running)
+        for cancellable in running:
+            cancellable.cancel()
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def __run(self):
+        filePaths = self.__find_files()
+        self._total = len(filePaths)
+        self._on_progress(0, self._total)
+
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="addiks-hints-scan")
+        for filePath in filePaths:
+            executor.submit(self.__scan_file, filePath)
+        executor.shutdown(wait=True)
+
+        self._on_finished(self._cancelled)
+
+    def __find_files(self):
+        filePaths = []
+        for directory, subDirectories, fileNames in os.walk(self._directory):
+            if self._cancelled:
+                break
+            subDirectories[:] = [name for name in subDirectories if name[0:1] != "."]
+            for fileName in fileNames:
+                if fileName[-4:] == '.php':
+                    filePaths.append(os.path.join(directory, fileName))
+        return sorted(filePaths)
+
+    def __scan_file(self, filePath):
+        cancellable = Cancellable()
+        with self._lock:
+            if self._cancelled:
+                return
+            self._running.append(cancellable)
+
+        try:
+            # the adapters run right here; the shared pool of the hint manager is
+            # small and the checks of the editor wait in it
+            hints = self._hint_manager.get_hints_by_file(filePath, None, cancellable, False)
+        except (OSError, UnicodeError) as error:
+            print(error)
+            hints = []
+
+        with self._lock:
+            self._running.remove(cancellable)
+            self._done += 1
+            done = self._done
+
+        if hints != None and not self._cancelled:
+            self._on_result(filePath, hints)
+        self._on_progress(done, self._total)
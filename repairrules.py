@@ -0,0 +1,305 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+from hint import Hint
+
+# What the detectors look for. Only the plain forms; anything else is left to the next run of phpcs.
+CLASS_BRACE    = re.compile(r'^\s*((?:abstract|final)\s+)*(class|interface|trait)\s+\w+[^{]*\{\s*$')
+FUNCTION_BRACE = re.compile(r'^\s*((?:abstract|final|public|protected|private|static)\s+)*(function)\s+&?\w+\s*\(.*\)[^{;]*\{\s*$')
+ELSE_IF        = re.compile(r'^\s*(?:\}\s*)?(else if)\b')
+STATIC_ORDER   = re.compile(r'^\s*(?:(?:abstract|final)\s+)?(static (?:public|protected|private) )')
+
+# Repairs for the findings of phpcs that can be fixed mechanically.
+#
+# Rules are registered once: those for a fixed message in a dict, those with
+# numbers or names in the message as a regex plus a keyword the message must
+# contain before the regex is even tried. A rule gets the text of the line a
+# finding is on and returns the edits to make on it, as [columnBegin,
+# columnEnd, replacement]; repair() collects the edits of all findings and
+# hands out the new text of every changed line.
+#
+# A rule may also have a detector that finds its problem in a single line of
+# text. repair_until_fixed() uses these to check the lines it changed again
+# without running phpcs, so fixes that cause new findings (a brace moved to
+# its own line leaves whitespace behind) get repaired in the same go.
+class RepairRules:
+
+    def __init__(self):
+        self._exact    = {} # message => handler
+        self._patterns = [] # [keyword, compiled pattern, handler]
+        self._matches  = {} # message => [handler, match], or None if nothing matches
+        self._detectors = [] # [message, detector]
+
+        self.add_exact('Opening brace of a class must be on the line after the definition',
+            self.__fix_class_brace, self.__detect_class_brace)
+        self.add_exact('Opening brace should be on a new line',
+            self.__fix_brace_new_line, self.__detect_function_brace)
+        self.add_exact('Usage of ELSE IF is discouraged; use ELSEIF instead',
+            self.__fix_else_if, self.__detect_else_if)
+        self.add_exact('The static declaration must come after the visibility declaration',
+            self.__fix_static_order, self.__detect_static_order)
+        self.add_exact('Whitespace found at end of line',
+            self.__fix_trailing_whitespace, self.__detect_trailing_whitespace)
+
+        self.add_pattern(' keyword; ',
+            r'Expected (\d+) space after ([A-Z_]+) keyword; (\d+) found', self.__fix_keyword_space)
+        self.add_pattern('indented incorrectly',
+            r'[A-Za-z ]+ indented incorrectly; expected( at least)? (\d+) spaces, found (\d+)', self.__fix_indention)
+        self.add_pattern('space after closing brace',
+            r'Expected (\d+) space after closing brace; (\d+) found', self.__fix_closing_brace_space)
+        self.add_pattern('newline after opening brace',
+            r'Expected (\d+) newline after opening brace; (\d+) found', self.__fix_opening_brace_newline)
+        self.add_pattern('space after closing parenthesis',
+            r'Expected (\d+) space after closing parenthesis; found (\d+)', self.__fix_parenthesis_space)
+
+    def add_exact(self, message, handler, detector=None):
+        # detector(line) => [[columnBegin, columnEnd], ...] of the problems in that line
+        self._exact[message] = handler
+        self._matches = {}
+        if detector != None:
+            self._detectors.append([message, detector])
+
+    def add_pattern(self, keyword, patternString, handler):
+        self._patterns.append([keyword, re.compile(patternString), handler])
+        self._matches = {}
+
+    def find(self, message):
+        if message in self._matches:
+            return self._matches[message]
+
+        found = None
+        if message in self._exact:
+            found = [self._exact[message], None]
+        else:
+            for keyword, pattern, handler in self._patterns:
+                if keyword in message:
+                    match = pattern.match(message)
+                    if match != None:
+                        found = [handler, match]
+                        break
+
+        if len(self._matches) > 4096:
+            self._matches = {}
+        self._matches[message] = found
+        return found
+
+    def repair(self, lines, hints):
+        # => {lineNumber: new text of that line (may contain newlines)}
+        edits = {}
+        for hint in hints:
+            found = self.find(hint.message)
+            if found == None:
+                continue
+            handler, match = found
+
+            lineNumber = max(0, min(hint.line_begin, len(lines)-1))
+            line = lines[lineNumber]
+
+            columnBegin = max(0, min(hint.column_begin, len(line)-1))
+            columnEnd   = hint.column_end
+            if hint.line_end == hint.line_begin:
+                columnEnd = max(0, min(columnEnd, len(line)-1))
+
+            for edit in handler(line, columnBegin, columnEnd, match):
+                if lineNumber not in edits:
+                    edits[lineNumber] = []
+                edits[lineNumber].append(edit)
+
+        changes = {}
+        for lineNumber in edits:
+            line = lines[lineNumber]
+            # right to left, so the columns of the remaining edits stay valid
+            lastBegin = len(line)
+            for columnBegin, columnEnd, replacement in sorted(set(map(tuple, edits[lineNumber])), reverse=True):
+                if columnEnd > lastBegin:
+                    continue # overlaps an edit already made
+                line = line[:columnBegin] + replacement + line[columnEnd:]
+                lastBegin = columnBegin
+            if line != lines[lineNumber]:
+                changes[lineNumber] = line
+        return changes
+
+    def repair_until_fixed(self, lines, hints, get_cached_hints=None, cycleLimit=5):
+        # => [new lines, number of cycles that changed something]
+        # Between two cycles the tools do not run: findings on untouched lines get moved
+        # along and the changed lines are checked by the detectors. get_cached_hints(lines)
+        # may hand out the real findings of a content that was checked before.
+        # Only rules the ruleset of the file reported are checked again, a detector
+        # must not bring up what the ruleset allows (like braces on the same line).
+        enforced = set([hint.message for hint in hints])
+        cycles = 0
+        while cycles < cycleLimit:
+            changes = self.repair(lines, hints)
+            if len(changes) <= 0:
+                break
+            cycles += 1
+            lines, hints = self.__apply(lines, hints, changes, enforced)
+            if get_cached_hints != None:
+                cachedHints = get_cached_hints(lines)
+                if cachedHints != None:
+                    hints = cachedHints
+                    enforced.update([hint.message for hint in hints])
+        return [lines, cycles]
+
+    def check_line(self, line, lineNumber, messages):
+        # => the findings of the detectors for the given messages in that line
+        hints = []
+        for message, detector in self._detectors:
+            if message not in messages:
+                continue
+            for columnBegin, columnEnd in detector(line):
+                hints.append(Hint(lineNumber, lineNumber, columnBegin, columnEnd, message, "#A5A5A5", 100))
+        return hints
+
+    ### HELPERS
+
+    def __apply(self, lines, hints, changes, enforced):
+        newLines = []
+        lineMap  = [] # old line number => new line number
+        newHints = []
+        for lineNumber in range(len(lines)):
+            lineMap.append(len(newLines))
+            if lineNumber in changes:
+                for line in changes[lineNumber].split("\n"):
+                    newHints += self.check_line(line, len(newLines), enforced)
+                    newLines.append(line)
+            else:
+                newLines.append(lines[lineNumber])
+
+        for hint in hints:
+            lineBegin = max(0, min(hint.line_begin, len(lines)-1))
+            lineEnd   = max(lineBegin, min(hint.line_end, len(lines)-1))
+            if lineBegin == lineEnd and lineBegin in changes:
+                continue # fixed, or found again by the detectors above
+            if lineMap[lineBegin] - lineBegin == lineMap[lineEnd] - lineEnd:
+                newHints.append(hint.shifted(lineMap[lineBegin] - lineBegin))
+            else:
+                newHints.append(Hint(
+                    lineMap[lineBegin], lineMap[lineEnd], hint.column_begin, hint.column_end,
+                    hint.message, hint.color, hint.priority, hint.ruleset
+                ))
+
+        return [newLines, newHints]
+
+    def __change_spaces(self, line, column, expected, actual):
+        if expected > actual:
+            return [[column, column, " " * (expected - actual)]]
+        if actual > expected and line[column:column + actual - expected].strip() == "":
+            return [[column, column + actual - expected, ""]]
+        return []
+
+    def __get_indention(self, line):
+        return " " * (len(line) - len(line.lstrip()))
+
+    ### RULES
+
+    def __fix_class_brace(self, line, columnBegin, columnEnd, match):
+        position = line.find("{", columnBegin)
+        if position < 0:
+            return []
+        # the spaces before the brace would be left behind at the end of the line
+        return [[len(line[:position].rstrip()), position, "\n"]]
+
+    def __fix_brace_new_line(self, line, columnBegin, columnEnd, match):
+        position = line.find("{", columnBegin)
+        if position < 0:
+            return []
+        return [[len(line[:position].rstrip()), position, "\n" + self.__get_indention(line)]]
+
+    def __fix_else_if(self, line, columnBegin, columnEnd, match):
+        if line[columnBegin:columnBegin+7].lower() != "else if":
+            return []
+        return [[columnBegin, columnBegin+7, "elseif"]]
+
+    def __fix_static_order(self, line, columnBegin, columnEnd, match):
+        # "static public function" => "public static function"
+        if line[columnBegin:columnBegin+7] != "static ":
+            return []
+        visibilityEnd = line.find(" ", columnBegin+7)
+        if visibilityEnd < 0:
+            return []
+        visibility = line[columnBegin+7:visibilityEnd]
+        return [[columnBegin, visibilityEnd+1, visibility + " static "]]
+
+    def __fix_trailing_whitespace(self, line, columnBegin, columnEnd, match):
+        stripped = line.rstrip(" ")
+        if len(stripped) == len(line):
+            return []
+        return [[len(stripped), len(line), ""]]
+
+    def __fix_keyword_space(self, line, columnBegin, columnEnd, match):
+        expected, token, actual = match.group(1, 2, 3)
+        position = line.lower().find(token.lower(), columnBegin)
+        if position < 0:
+            return []
+        return self.__change_spaces(line, position + len(token), int(expected), int(actual))
+
+    def __fix_indention(self, line, columnBegin, columnEnd, match):
+        expected, actual = match.group(2, 3)
+        return self.__change_spaces(line, 0, int(expected), int(actual))
+
+    def __fix_closing_brace_space(self, line, columnBegin, columnEnd, match):
+        expected, actual = match.group(1, 2)
+        position = line.rfind("}", 0, columnBegin+1)
+        if position < 0:
+            return []
+        return self.__change_spaces(line, position+1, int(expected), int(actual))
+
+    def __fix_opening_brace_newline(self, line, columnBegin, columnEnd, match):
+        # only adds newlines; removing them would join lines
+        expected, actual = match.group(1, 2)
+        position = line.find("{", columnBegin)
+        if position < 0 or int(expected) <= int(actual):
+            return []
+        return [[position+1, position+1, "\n" * (int(expected) - int(actual))]]
+
+    def __fix_parenthesis_space(self, line, columnBegin, columnEnd, match):
+        expected, actual = match.group(1, 2)
+        return self.__change_spaces(line, columnEnd, int(expected), int(actual))
+
+    ### DETECTORS
+
+    def __detect_class_brace(self, line):
+        match = CLASS_BRACE.match(line)
+        if match == None:
+            return []
+        return [[match.start(2), match.end(2)]]
+
+    def __detect_function_brace(self, line):
+        match = FUNCTION_BRACE.match(line)
+        if match == None:
+            return []
+        return [[match.start(2), match.end(2)]]
+
+    def __detect_else_if(self, line):
+        match = ELSE_IF.match(line)
+        if match == None:
+            return []
+        return [[match.start(1), match.end(1)]]
+
+    def __detect_static_order(self, line):
+        match = STATIC_ORDER.match(line)
+        if match == None:
+            return []
+        return [[match.start(1), match.start(1)+6]]
+
+    def __detect_trailing_whitespace(self, line):
+        stripped = line.rstrip(" ")
+        if len(stripped) == len(line):
+            return []
+        return [[len(stripped), len(line)]]
@@ -0,0 +1,120 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import csv
+import time
+from threading import Lock
+
+# Seconds between two checks whether the CSV file was changed from outside.
+RECHECK_INTERVAL = 2.0
+
+# The rulesets of one rulesets.csv ("<directory>,<ruleset>" per row), held in
+# memory as a trie of directory components. The CSV is only parsed again when
+# its mtime or size changes; looking up the rulesets of a file costs one trie
+# step per directory of its path.
+class RulesetIndex:
+
+    def __init__(self, csvPath):
+        self._csv_path   = csvPath
+        self._rows       = []
+        self._trie       = [{}, []] # [children, [[rowIndex, directory, ruleset], ...]]
+        self._stat       = None
+        self._checked_at = None
+        self._lock       = Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = None
+            self._stat = None
+
+    def get_all(self):
+        with self._lock:
+            self.__refresh()
+            rows = []
+            for directory, ruleset in self._rows:
+                rows.append([directory, ruleset])
+            return rows
+
+    def get_rulesets_for_file(self, filePath):
+        rulesets = []
+        for rowIndex, directory, ruleset in self.__get_matches(filePath):
+            rulesets.append(ruleset)
+        return rulesets
+
+    def get_directories_for_file(self, filePath):
+        directories = []
+        for rowIndex, directory, ruleset in self.__get_matches(filePath):
+            if directory not in directories:
+                directories.append(directory)
+        return directories
+
+    def __get_matches(self, filePath):
+        with self._lock:
+            self.__refresh()
+            matches = []
+            node = self._trie
+            matches += node[1]
+            for part in self.__split(filePath):
+                if part not in node[0]:
+                    break
+                node = node[0][part]
+                matches += node[1]
+            return sorted(matches)
+
+    def __refresh(self):
+        now = time.monotonic()
+        if self._checked_at != None and now - self._checked_at < RECHECK_INTERVAL:
+            return
+        self._checked_at = now
+
+        try:
+            stat = os.stat(self._csv_path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stat = None
+
+        if stat == self._stat and self._stat != None:
+            return
+        self._stat = stat
+
+        rows = []
+        if stat != None:
+            with open(self._csv_path, "r") as handle:
+                reader = csv.reader(handle, delimiter=",")
+                for row in reader:
+                    if len(row) >= 2:
+                        rows.append([row[0], row[1]])
+
+        trie = [{}, []]
+        for rowIndex in range(len(rows)):
+            directory, ruleset = rows[rowIndex]
+            node = trie
+            for part in self.__split(directory):
+                if part not in node[0]:
+                    node[0][part] = [{}, []]
+                node = node[0][part]
+            node[1].append([rowIndex, directory, ruleset])
+
+        self._rows = rows
+        self._trie = trie
+
+    def __split(self, path):
+        parts = []
+        for part in path.split("/"):
+            if part != "":
+                parts.append(part)
+        return parts
@@ -0,0 +1,209 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-dbgp-plugin
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import subprocess
+from threading import Lock
+
+# One resident php-tool-server.php process, reached over a unix socket.
+# The server shuts itself down when idle or too big; it then gets started
+# again on the next request. The ToolLimits of its adapter give the timeout of
+# a request and the memory limit of the process.
+class ToolServer:
+
+    def __init__(self, command, socketPath, limits, startTimeout=10.0):
+        self._command       = command
+        self._socket_path   = socketPath
+        self._limits        = None
+        self._timeout       = None
+        self._start_timeout = startTimeout
+        self._process       = None
+        self._lock          = Lock()
+        self.set_limits(limits)
+
+    def request(self, path, content):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._process == None or self._process.poll() != None:
+                        self.__start()
+                    return self.__request(path, content)
+                except socket.timeout:
+                    # a hanging server gets killed, but don't wait for it twice
+                    self.__stop()
+                    raise TimeoutError("tool server did not answer within %s seconds" % self._timeout)
+                except (OSError, ValueError) as error:
+                    print(error)
+                    self.__stop()
+            return None
+
+    def set_limits(self, limits):
+        self._limits = limits
+        self._timeout = limits.timeout
+        if limits.timeout <= 0:
+            self._timeout = None
+
+    def shutdown(self):
+        with self._lock:
+            self.__stop()
+
+    def __request(self, path, content):
+        path = path.encode()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.settimeout(self._timeout)
+            client.connect(self._socket_path)
+            client.sendall(
+                str(len(path)).encode() + b"\n" + path +
+                str(len(content)).encode() + b"\n" + content
+            )
+            reader = client.makefile("rb")
+            length = int(reader.readline())
+            report = reader.read(length)
+            reader.close()
+            if len(report) < length:
+                raise OSError("tool server closed the connection")
+            return report
+        finally:
+            client.close()
+
+    def __start(self):
+        self.__stop()
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        self._process = subprocess.Popen(
+            self._command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        # no cpu limit, the server lives through many requests
+        self._limits.apply(self._process, False)
+        startedAt = time.monotonic()
+        while not os.path.exists(self._socket_path):
+            if self._process.poll() != None:
+                raise OSError("tool server exited during startup: %s" % " ".join(self._command))
+            if time.monotonic() - startedAt > self._start_timeout:
+                raise OSError("tool server did not start: %s" % " ".join(self._command))
+            time.sleep(0.02)
+
+    def __stop(self):
+        if self._process != None:
+            if self._process.poll() == None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
+
+
+# The tool servers of one tool, one per (comma separated) ruleset.
+# A server reads its rulesets only once, so it gets replaced when one of the
+# ruleset files changes.
+class ToolServerPool:
+
+    def __init__(self, tool, idleTimeout, memoryLimit, limits):
+        self._tool         = tool
+        self._idle_timeout = idleTimeout
+        self._memory_limit = memoryLimit
+        self._limits       = limits
+        self._servers      = {} # ruleset => [ruleset mtimes, ToolServer or None]
+        self._lock         = Lock()
+
+    def request(self, ruleset, path, content):
+        server = self.__get_server(ruleset)
+        if server == None:
+            return None
+        return server.request(path, content)
+
+    def set_limits(self, limits):
+        with self._lock:
+            self._limits = limits
+            for ruleset in self._servers:
+                if self._servers[ruleset][1] != None:
+                    self._servers[ruleset][1].set_limits(limits)
+
+    def shutdown(self):
+        with self._lock:
+            servers = self._servers
+            self._servers = {}
+        for ruleset in servers:
+            if servers[ruleset][1] != None:
+                servers[ruleset][1].shutdown()
+
+    def __get_server(self, ruleset):
+        mtimes = self.__get_ruleset_mtimes(ruleset)
+        outdated = None
+        with self._lock:
+            if ruleset in self._servers and self._servers[ruleset][0] != mtimes:
+                outdated = self._servers.pop(ruleset)[1]
+            if ruleset not in self._servers:
+                toolBinary = shutil.which(self._tool)
+                if toolBinary == None:
+                    self._servers[ruleset] = [mtimes, None]
+                else:
+                    try:
+                        socketPath = self.__get_socket_path(ruleset)
+                    except OSError as error:
+                        # the adapter runs the tool itself instead; tried again on the next request
+                        print(error)
+                        socketPath = None
+                    if socketPath != None:
+                        plugin_path = os.path.dirname(__file__)
+                        self._servers[ruleset] = [mtimes, ToolServer([
+                            "/usr/bin/env", "php", plugin_path+"/php-tool-server.php",
+                            self._tool,
+                            socketPath,
+                            ruleset,
+                            toolBinary,
+                            str(self._idle_timeout),
+                            str(self._memory_limit),
+                        ], socketPath, self._limits)]
+            server = None
+            if ruleset in self._servers:
+                server = self._servers[ruleset][1]
+        if outdated != None:
+            outdated.shutdown()
+        return server
+
+    def __get_ruleset_mtimes(self, ruleset):
+        # standards given by name (e.g. "PSR2") have no file to watch
+        mtimes = []
+        for rulesetPart in ruleset.split(","):
+            try:
+                mtimes.append(os.stat(rulesetPart).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def __get_socket_path(self, ruleset):
+        directory = os.environ.get("XDG_RUNTIME_DIR")
+        if directory == None or not os.path.isdir(directory):
+            directory = tempfile.gettempdir()
+        directory = os.path.join(directory, "addiks-hints-%d" % os.getuid())
+        # the phpcs and phpmd pools may get here at the same time
+        os.makedirs(directory, 0o700, exist_ok=True)
+        # in a shared /tmp someone else could have made it first
+        directoryStat = os.lstat(directory)
+        if not stat.S_ISDIR(directoryStat.st_mode) or directoryStat.st_uid != os.getuid() or directoryStat.st_mode & 0o077:
+            raise OSError("unsafe socket directory %s" % directory)
+        rulesetHash = hashlib.sha1(ruleset.encode()).hexdigest()[0:12]
+        return os.path.join(directory, "%s-%s.sock" % (self._tool, rulesetHash))